@@ -0,0 +1,129 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from config import db, User, WorkType, Order, ArchivedOrder, OrderDailyStats, RegistrationDailyStats
+
+DIALECT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def _increment(model, keys, rows):
+    # rows: {ключ: {колонка: прирост}}; одна вставка с ON CONFLICT на весь набор
+    if not rows:
+        return
+    insert = DIALECT_INSERTS[db.session.get_bind().dialect.name]
+    columns = next(iter(rows.values())).keys()
+    statement = insert(model).values([dict(zip(keys, key), **values) for key, values in rows.items()])
+    statement = statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={c: getattr(model, c) + getattr(statement.excluded, c) for c in columns},
+    )
+    db.session.execute(statement)
+
+
+def record_orders_created(orders):
+    counts = Counter((order.created_at.date(), order.work_type_id) for order in orders)
+    _increment(OrderDailyStats, ['day', 'work_type_id'],
+               {key: {'orders_count': n, 'paid_count': 0} for key, n in counts.items()})
+
+
+def record_orders_paid(rows):
+    # rows — (created_at, work_type_id) только что оплаченных заказов
+    counts = Counter((created_at.date(), work_type_id) for created_at, work_type_id in rows)
+    _increment(OrderDailyStats, ['day', 'work_type_id'],
+               {key: {'orders_count': 0, 'paid_count': n} for key, n in counts.items()})
+
+
+def record_registration(day, count=1):
+    _increment(RegistrationDailyStats, ['day'], {(day,): {'users_count': count}})
+
+
+def record_orders_deleted(rows):
+    # rows — (created_at, work_type_id, is_paid) удалённых заказов; счётчики уменьшаются одним executemany,
+    # строк, которых нет в сводке, не создаём
+    counts = defaultdict(lambda: [0, 0])
+    for created_at, work_type_id, is_paid in rows:
+        counts[created_at.date(), work_type_id][0] += 1
+        counts[created_at.date(), work_type_id][1] += 1 if is_paid else 0
+    if not counts:
+        return
+    table = OrderDailyStats.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.day == bindparam('b_day'), table.c.work_type_id == bindparam('b_work_type_id'))
+        .values(orders_count=table.c.orders_count - bindparam('b_orders'),
+                paid_count=table.c.paid_count - bindparam('b_paid')),
+        [{'b_day': day, 'b_work_type_id': work_type_id, 'b_orders': orders, 'b_paid': paid}
+         for (day, work_type_id), (orders, paid) in counts.items()])
+
+
+def record_user_deleted(created_at):
+    if created_at is None:
+        return
+    table = RegistrationDailyStats.__table__
+    db.session.execute(update(table).where(table.c.day == created_at.date())
+                       .values(users_count=table.c.users_count - 1))
+
+
+def rebuild_rollups():
+    # Полный пересчёт по таблицам order, order_archive и user; запускать вне рабочего времени
+    # Архив может быть другой базой: считаем его до записи и добавляем к счётчикам (все архивные заказы оплачены)
+    archive_day = func.date(ArchivedOrder.created_at, type_=db.Date)
+    archived = db.session.execute(
+        select(archive_day, ArchivedOrder.work_type_id, func.count(ArchivedOrder.id))
+        .group_by(archive_day, ArchivedOrder.work_type_id)).all()
+    OrderDailyStats.query.delete()
+    RegistrationDailyStats.query.delete()
+    order_day = func.date(Order.created_at)
+    db.session.execute(OrderDailyStats.__table__.insert().from_select(
+        ['day', 'work_type_id', 'orders_count', 'paid_count'],
+        select(order_day, Order.work_type_id, func.count(Order.id),
+               func.sum(db.case((Order.is_paid.is_(True), 1), else_=0)))
+        .group_by(order_day, Order.work_type_id)))
+    _increment(OrderDailyStats, ['day', 'work_type_id'],
+               {(day, work_type_id): {'orders_count': n, 'paid_count': n} for day, work_type_id, n in archived})
+    user_day = func.date(User.created_at)
+    db.session.execute(RegistrationDailyStats.__table__.insert().from_select(
+        ['day', 'users_count'],
+        select(user_day, func.count(User.id)).where(User.created_at.is_not(None)).group_by(user_day)))
+    db.session.commit()
+
+
+def _bucket(day, period):
+    return day - timedelta(days=day.weekday()) if period == 'week' else day
+
+
+def dashboard_data(period, days):
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    names = dict(db.session.query(WorkType.id, WorkType.name))
+
+    orders = defaultdict(Counter)
+    rows = db.session.query(OrderDailyStats.day, OrderDailyStats.work_type_id,
+                            func.sum(OrderDailyStats.orders_count)) \
+        .filter(OrderDailyStats.day >= since) \
+        .group_by(OrderDailyStats.day, OrderDailyStats.work_type_id)
+    for day, work_type_id, count in rows:
+        orders[_bucket(day, period)][names.get(work_type_id, f'#{work_type_id} (удален)')] += count
+
+    total, paid = db.session.query(func.coalesce(func.sum(OrderDailyStats.orders_count), 0),
+                                   func.coalesce(func.sum(OrderDailyStats.paid_count), 0)) \
+        .filter(OrderDailyStats.day >= since).one()
+
+    registrations = Counter()
+    for day, count in db.session.query(RegistrationDailyStats.day, RegistrationDailyStats.users_count) \
+            .filter(RegistrationDailyStats.day >= since):
+        registrations[_bucket(day, period)] += count
+
+    return {
+        'since': since,
+        'work_types': sorted({name for bucket in orders.values() for name in bucket}),
+        'orders': sorted(orders.items()),
+        'total': total,
+        'paid': paid,
+        'registrations': sorted(registrations.items()),
+    }
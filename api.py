@@ -0,0 +1,211 @@
+import hashlib
+import json
+
+from flask import Blueprint, Response, current_app, request
+from flask_login import current_user
+from sqlalchemy import select
+from werkzeug.http import is_resource_modified
+
+from config import db, WorkType, Mechanic, Order, ArchivedOrder
+from archive import order_archive
+from database import replica_router
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Поля, доступные через ?fields=; по умолчанию отдаются все
+WORK_TYPE_FIELDS = {
+    'id': WorkType.id,
+    'name': WorkType.name,
+    'description': WorkType.description,
+}
+MECHANIC_FIELDS = {
+    'id': Mechanic.id,
+    'name': Mechanic.name,
+    'phone': Mechanic.phone,
+    'specialization': Mechanic.specialization,
+}
+ORDER_FIELDS = {
+    'id': Order.id,
+    'work_type_id': Order.work_type_id,
+    'mechanic_id': Order.mechanic_id,
+    'created_at': Order.created_at,
+    'is_paid': Order.is_paid,
+    'slot_start': Order.slot_start,
+    'slot_end': Order.slot_end,
+}
+ARCHIVED_ORDER_FIELDS = {name: getattr(ArchivedOrder, name) for name in ORDER_FIELDS}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _json_default(value):
+    return value.isoformat()
+
+
+def dumps(data):
+    # orjson в несколько раз быстрее json и сам сериализует datetime; без него — компактный json
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=_json_default).encode()
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype='application/json')
+
+
+@bp.before_request
+def route_reads():
+    # API только читает, кроме POST-маршрутов основного blueprint
+    replica_router.use_replica()
+
+
+@bp.errorhandler(ApiError)
+def api_error(error):
+    return json_response({'error': error.message}, error.status)
+
+
+def _fields(available):
+    requested = request.args.get('fields')
+    if not requested:
+        return list(available)
+    fields = list(dict.fromkeys(f.strip() for f in requested.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in available]
+    if unknown or not fields:
+        raise ApiError(f"Неизвестные поля: {', '.join(unknown) or '(пусто)'}. Доступны: {', '.join(available)}")
+    return fields
+
+
+def _limit():
+    default = current_app.config['API_PAGE_SIZE']
+    limit = request.args.get('limit', default, type=int)
+    return min(max(limit, 1), current_app.config['API_MAX_PAGE_SIZE'])
+
+
+def _cursor():
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return None
+    if not cursor.isdigit():
+        raise ApiError('Неверный cursor')
+    return int(cursor)
+
+
+def _conditional(payload):
+    # Ответ полностью определяется версиями строк, поэтому ETag строгий и считается до сериализации
+    etag = hashlib.sha1(repr(payload).encode()).hexdigest()
+    response = None if is_resource_modified(request.environ, etag=etag) else Response(status=304)
+    return etag, response
+
+
+def _finish(response, etag, private):
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+        response.vary.add('Cookie')
+    else:
+        response.cache_control.public = True
+    return response
+
+
+def _select(model, available, fields, *extra):
+    return select(model.id.label('_id'), model.version.label('_version'), *extra,
+                  *[available[f].label(f) for f in fields])
+
+
+def _page(model, available, fields, conditions, after, limit, descending, archived):
+    # Для таблиц с архивом нужна дата создания: по ней решается, читать ли архив
+    extra = [model.created_at.label('_created_at')] if archived else []
+    query = _select(model, available, fields, *extra).where(*conditions)
+    if after is not None:
+        query = query.where(model.id < after if descending else model.id > after)
+    query = query.order_by(model.id.desc() if descending else model.id).limit(limit + 1)
+    return db.session.execute(query).all()
+
+
+def _list(model, available, conditions, descending=False, private=False, archive=None):
+    # archive — (модель, поля, условия) архивной таблицы, которая дочитывается к старым страницам
+    fields = _fields(available)
+    limit = _limit()
+    after = _cursor()
+    rows = _page(model, available, fields, conditions, after, limit, descending, archive is not None)
+    # Страницы идут по id, а архив отсекается по дате: id растут вместе с created_at, заданным при вставке
+    if archive is not None and order_archive.needs_archive(rows, limit, lambda row: row._created_at):
+        archive_model, archive_fields, archive_conditions = archive
+        archived = _page(archive_model, archive_fields, fields, archive_conditions, after, limit, descending, True)
+        rows = order_archive.merge(rows, archived, limit, lambda row: (row._id, row._created_at), descending)
+    next_cursor = str(rows[limit - 1]._id) if len(rows) > limit else None
+    rows = rows[:limit]
+
+    etag, response = _conditional((request.path, fields, after, limit, next_cursor,
+                                   [(row._id, row._version) for row in rows]))
+    if response is None:
+        data = [{f: getattr(row, f) for f in fields} for row in rows]
+        response = json_response({'data': data, 'next_cursor': next_cursor})
+    return _finish(response, etag, private)
+
+
+def _detail(model, available, conditions, private=False, archive=None):
+    fields = _fields(available)
+    row = db.session.execute(_select(model, available, fields).where(*conditions)).first()
+    if row is None and archive is not None:
+        archive_model, archive_fields, archive_conditions = archive
+        row = db.session.execute(_select(archive_model, archive_fields, fields).where(*archive_conditions)).first()
+    if row is None:
+        raise ApiError('Не найдено', 404)
+    etag, response = _conditional((request.path, fields, row._id, row._version))
+    if response is None:
+        response = json_response({'data': {f: getattr(row, f) for f in fields}})
+    return _finish(response, etag, private)
+
+
+def _require_login():
+    # API отвечает 401, а не перенаправлением на страницу входа
+    if not current_user.is_authenticated:
+        raise ApiError('Требуется вход', 401)
+
+
+@bp.route('/work_types')
+def work_types():
+    return _list(WorkType, WORK_TYPE_FIELDS, [WorkType.deleted_at.is_(None)])
+
+
+@bp.route('/work_types/<int:id>')
+def work_type(id):
+    return _detail(WorkType, WORK_TYPE_FIELDS, [WorkType.id == id, WorkType.deleted_at.is_(None)])
+
+
+@bp.route('/mechanics')
+def mechanics():
+    return _list(Mechanic, MECHANIC_FIELDS, [])
+
+
+@bp.route('/mechanics/<int:id>')
+def mechanic(id):
+    return _detail(Mechanic, MECHANIC_FIELDS, [Mechanic.id == id])
+
+
+@bp.route('/orders')
+def orders():
+    _require_login()
+    # Новые заказы первыми, как в профиле
+    return _list(Order, ORDER_FIELDS, [Order.user_id == current_user.id], descending=True, private=True,
+                 archive=(ArchivedOrder, ARCHIVED_ORDER_FIELDS, [ArchivedOrder.user_id == current_user.id]))
+
+
+@bp.route('/orders/<int:id>')
+def order(id):
+    _require_login()
+    return _detail(Order, ORDER_FIELDS, [Order.id == id, Order.user_id == current_user.id], private=True,
+                   archive=(ArchivedOrder, ARCHIVED_ORDER_FIELDS,
+                            [ArchivedOrder.id == id, ArchivedOrder.user_id == current_user.id]))
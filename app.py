@@ -1,85 +1,111 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, flash, \
+    make_response, jsonify, abort, Response, stream_with_context
+from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from flask_migrate import Migrate
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from werkzeug.http import is_resource_modified
 import os
 import sys
 import re
-from datetime import datetime, date
+import hashlib
+import json
+import uuid
+from datetime import datetime
+from functools import wraps
 
 # Добавляем путь к директории Praktika в PYTHONPATH
 current_dir = os.path.dirname(os.path.abspath(__file__))
 summer_practic_dir = os.path.join(current_dir, 'Praktika')
 sys.path.append(summer_practic_dir)
 
-# Импорт app и db из config.py
-from config import app, db, User, WorkType, Order, Mechanic
+# Импорт db и моделей из config.py
+from config import Config, db, User, WorkType, Order, ArchivedOrder, Mechanic, Job
+from cache import catalog_cache
+from search import clean_query, search_filter
+from database import configure_database, install_sqlite_pragmas, write_queue, replica_router, read_replica
+from security import HashingBusy, password_hasher, login_limiter
+from commands import register_commands
+from metrics import metrics
+from analytics import dashboard_data, record_orders_created, record_orders_paid, record_registration
+from scheduling import scheduler
+from assets import assets
+from identity import identity_cache
+from validation import validate_user, validate_mechanic
+from transfer import EXPORT_QUERIES, EXPORT_FORMATS, IMPORT_COLUMNS, IMPORTERS, export_chunks
+from jobs import job_runner
+from archive import order_archive
+from events import events, format_sse, TooManySubscribers
+from api import bp as api_bp
+
+bp = Blueprint('main', __name__)
 
-# Инициализация Flask-Login
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
-
-# Инициализация Flask-Migrate
-migrate = Migrate(app, db)
+login_manager.login_view = 'main.login'
+
+migrate = Migrate()
+
+
+def create_app(config=None):
+    # Импорт модуля ничего не делает с базой: таблицы и данные создают flask init-db и flask seed
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+    configure_database(app, app.config['DATABASE_PROFILE'])
+    os.makedirs(app.instance_path, exist_ok=True)
+
+    db.init_app(app)
+    with app.app_context():
+        # PRAGMA и метрики нужны на всех движках, включая реплики
+        for engine in db.engines.values():
+            install_sqlite_pragmas(app, engine)
+        metrics.init_app(app, *db.engines.values())
+    replica_router.init_app(app, db)
+    login_manager.init_app(app)
+    migrate.init_app(app, db)
+    catalog_cache.init_app(app)
+    write_queue.init_app(app, db)
+    password_hasher.init_app(app)
+    identity_cache.init_app(app)
+    job_runner.init_app(app)
+    login_limiter.init_app(app)
+    scheduler.init_app(app)
+    events.init_app(app)
+    order_archive.init_app(app)
+    assets.init_app(app)
+
+    app.config['RELEASE_ID'] = release_id(app)
+
+    app.register_blueprint(bp)
+    app.register_blueprint(api_bp)
+    register_commands(app)
+    return app
+
+
+def release_id(app):
+    # Версия кода и шаблонов: APP_VERSION (например, хэш коммита) или хэш файлов приложения,
+    # плюс хэш манифеста статики после flask build-assets
+    digest = hashlib.sha1(f"{app.config.get('APP_VERSION') or ''}:{assets.build_id}".encode())
+    if not app.config.get('APP_VERSION'):
+        paths = [os.path.join(app.root_path, name) for name in os.listdir(app.root_path) if name.endswith('.py')]
+        template_folder = os.path.join(app.root_path, app.template_folder)
+        for root, dirs, files in os.walk(template_folder):
+            paths += [os.path.join(root, name) for name in files]
+        for path in sorted(paths):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-
-# Создание контекста приложения
-app.app_context().push()
-
-# Создание всех таблиц в базе данных
-db.create_all()
-
-# Создание первого администратора, если его еще нет
-with app.app_context():
-    if not User.query.filter_by(role='admin').first():
-        admin = User(
-            username='admin',
-            date_of_birth=date(1990, 1, 1),
-            gender='male',
-            role='admin',
-            phone='1234567890',
-            email='admin@example.com'
-        )
-        admin.set_password('admin123')
-        db.session.add(admin)
-        db.session.commit()
-        print("Первый администратор создан: username=admin, password=admin123")
-
-# Добавление видов работ, если их еще нет
-with app.app_context():
-    if not WorkType.query.first():
-        work_types = [
-            WorkType(name="Ремонт двигателя",
-                     description="Полный ремонт двигателя автомобиля, включая замену деталей и диагностику."),
-            WorkType(name="Покраска кузова",
-                     description="Качественная покраска кузова автомобиля с использованием современных материалов."),
-            WorkType(name="Замена шин", description="Сезонная замена шин, балансировка и проверка давления."),
-            WorkType(name="Диагностика электроники", description="Проверка и ремонт электронных систем автомобиля.")
-        ]
-        db.session.add_all(work_types)
-        db.session.commit()
-        print("Виды работ добавлены в базу данных")
-
-# Добавление исполнителей, если их еще нет
-with app.app_context():
-    if not Mechanic.query.first():
-        mechanics = [
-            Mechanic(name="Иван Иванов", phone="1234567890", specialization="Ремонт двигателей"),
-            Mechanic(name="Петр Петров", phone="0987654321", specialization="Покраска кузова"),
-            Mechanic(name="Алексей Сидоров", phone="1112223334", specialization="Диагностика электроники")
-        ]
-        db.session.add_all(mechanics)
-        db.session.commit()
-        print("Исполнители добавлены в базу данных")
+    # Без запроса к базе, пока запись в кэше не устарела
+    return identity_cache.get(int(user_id))
 
 
-@app.route("/register", methods=['GET', 'POST'])
+@bp.route("/register", methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
@@ -89,39 +115,16 @@ def register():
         phone = request.form.get('phone', '')
         email = request.form.get('email', '')
 
-        if len(username) < 3:
-            flash('Имя пользователя должно содержать минимум 3 символа!', 'error')
-            return redirect(url_for('register'))
-        if len(password) < 6:
-            flash('Пароль должен содержать минимум 6 символов!', 'error')
-            return redirect(url_for('register'))
+        error, dob = validate_user(username, password, date_of_birth, gender, phone, email)
+        if error:
+            flash(error, 'error')
+            return redirect(url_for('main.register'))
         if User.query.filter_by(username=username).first():
             flash('Пользователь с таким именем уже существует!', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
         if User.query.filter_by(email=email).first() and email:
             flash('Пользователь с таким email уже существует!', 'error')
-            return redirect(url_for('register'))
-
-        try:
-            dob = datetime.strptime(date_of_birth, '%Y-%m-%d').date()
-            if (date.today() - dob).days < 18 * 365:
-                flash('Вам должно быть не менее 18 лет!', 'error')
-                return redirect(url_for('register'))
-        except ValueError:
-            flash('Неверный формат даты! Используйте YYYY-MM-DD.', 'error')
-            return redirect(url_for('register'))
-
-        if gender not in ['male', 'female', 'other']:
-            flash('Неверное значение пола!', 'error')
-            return redirect(url_for('register'))
-
-        if phone and not re.match(r'^\d{10}$', phone):
-            flash('Номер телефона должен содержать ровно 10 цифр!', 'error')
-            return redirect(url_for('register'))
-
-        if email and not re.match(r'[^@]+@[^@]+\.[^@]+', email):
-            flash('Неверный формат email!', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
 
         user = User(
             username=username,
@@ -131,62 +134,161 @@ def register():
             phone=phone if phone else None,
             email=email if email else None
         )
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except HashingBusy:
+            flash('Сервер перегружен, попробуйте зарегистрироваться чуть позже.', 'error')
+            return redirect(url_for('main.register'))
         db.session.add(user)
+        record_registration(datetime.utcnow().date())
         db.session.commit()
         flash('Регистрация прошла успешно! Теперь вы можете войти.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     return render_template('register.html')
 
 
-@app.route("/login", methods=['GET', 'POST'])
+@bp.route("/login", methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
+        # Заблокированное имя отклоняем до хэширования, чтобы перебор не расходовал CPU
+        if login_limiter.is_blocked(username):
+            flash('Слишком много неудачных попыток входа. Попробуйте позже.', 'error')
+            return render_template('login.html'), 429
+        user = User.query.filter_by(username=username, deleted_at=None).first()
+        try:
+            valid = user is not None and user.check_password(password)
+        except HashingBusy:
+            flash('Сервер перегружен, попробуйте войти чуть позже.', 'error')
+            return render_template('login.html'), 503
+        if valid:
+            login_limiter.reset(username)
+            # Хэш со старыми параметрами пересчитываем, пока пароль известен
+            if user.password_needs_rehash():
+                try:
+                    user.set_password(password)
+                    db.session.commit()
+                except HashingBusy:
+                    pass
             login_user(user)
             flash('Вы успешно вошли!', 'success')
-            return redirect(url_for('profile'))
+            return redirect(url_for('main.profile'))
         else:
+            login_limiter.register_failure(username)
             flash('Неверное имя пользователя или пароль!', 'error')
     return render_template('login.html')
 
 
-@app.route("/profile")
-@login_required
-def profile():
-    orders = Order.query.filter_by(user_id=current_user.id).all()
-    return render_template('profile.html', user=current_user, orders=orders)
+def encode_order_cursor(order):
+    return f"{order.created_at.strftime('%Y-%m-%dT%H:%M:%S.%f')}_{order.id}"
 
 
-@app.route("/logout")
+def decode_order_cursor(cursor):
+    try:
+        created_at, order_id = cursor.rsplit('_', 1)
+        return datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%S.%f'), int(order_id)
+    except (ValueError, AttributeError):
+        return None
+
+
+@bp.route("/profile")
+@login_required
+@read_replica
+def profile():
+    status = request.args.get('status', '')
+    cursor = request.args.get('cursor', '')
+    per_page = current_app.config['ORDERS_PER_PAGE']
+
+    # Вид работы подгружаем в том же запросе, чтобы шаблон не делал SELECT на каждый заказ
+    query = Order.query.options(joinedload(Order.work_type), joinedload(Order.mechanic)) \
+        .filter(Order.user_id == current_user.id)
+    if status == 'paid':
+        query = query.filter(Order.is_paid.is_(True))
+    elif status == 'unpaid':
+        query = query.filter(Order.is_paid.is_(False))
+
+    # Keyset-пагинация по (created_at, id): следующая страница начинается после последнего заказа
+    position = decode_order_cursor(cursor) if cursor else None
+    if position:
+        created_at, order_id = position
+        query = query.filter(db.or_(Order.created_at < created_at,
+                                    db.and_(Order.created_at == created_at, Order.id < order_id)))
+
+    orders = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(per_page + 1).all()
+    # Старая история дочитывается из архива (там только оплаченные заказы)
+    if status != 'unpaid' and order_archive.needs_archive(orders, per_page, lambda order: order.created_at):
+        archived = ArchivedOrder.query.options(selectinload(ArchivedOrder.work_type),
+                                               selectinload(ArchivedOrder.mechanic)) \
+            .filter(ArchivedOrder.user_id == current_user.id)
+        if position:
+            archived = archived.filter(db.or_(ArchivedOrder.created_at < created_at,
+                                              db.and_(ArchivedOrder.created_at == created_at,
+                                                      ArchivedOrder.id < order_id)))
+        archived = archived.order_by(ArchivedOrder.created_at.desc(), ArchivedOrder.id.desc()) \
+            .limit(per_page + 1).all()
+        orders = order_archive.merge(orders, archived, per_page, lambda order: (order.created_at, order.id))
+    next_cursor = None
+    if len(orders) > per_page:
+        orders = orders[:per_page]
+        next_cursor = encode_order_cursor(orders[-1])
+    user = db.session.get(User, current_user.id)
+    return render_template('profile.html', user=user, orders=orders, status=status,
+                           next_cursor=next_cursor, is_first_page=position is None)
+
+
+@bp.route("/logout")
 @login_required
 def logout():
     logout_user()
     flash('Вы вышли из аккаунта!', 'success')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
+
+
+# Допустимые поля сортировки в справочниках администратора
+USER_SORT_COLUMNS = {
+    'username': User.username,
+    'email': User.email,
+    'phone': User.phone,
+    'date_of_birth': User.date_of_birth,
+}
+MECHANIC_SORT_COLUMNS = {
+    'name': Mechanic.name,
+    'phone': Mechanic.phone,
+    'specialization': Mechanic.specialization,
+}
 
 
-@app.route("/users")
+@bp.route("/users")
 @login_required
+@read_replica
 def users():
     if not current_user.is_admin():
         flash('Доступ запрещен! Только администраторы могут управлять пользователями.', 'error')
-        return redirect(url_for('profile'))
-    users = User.query.all()
-    return render_template('users.html', users=users)
-
-
-@app.route("/edit_user/<int:id>", methods=['GET', 'POST'])
+        return redirect(url_for('main.profile'))
+    q = clean_query(request.args.get('q', ''))
+    sort = request.args.get('sort', 'username')
+    direction = request.args.get('direction', 'asc')
+    page = request.args.get('page', 1, type=int)
+
+    column = USER_SORT_COLUMNS.get(sort, User.username)
+    query = User.query.filter(User.deleted_at.is_(None))
+    if q:
+        query = query.filter(search_filter(db, User, q))
+    query = query.order_by(column.desc() if direction == 'desc' else column.asc(), User.id)
+    pagination = query.paginate(page=page, per_page=current_app.config['ADMIN_PER_PAGE'], error_out=False)
+    return render_template('users.html', users=pagination.items, pagination=pagination,
+                           q=q, sort=sort, direction=direction)
+
+
+@bp.route("/edit_user/<int:id>", methods=['GET', 'POST'])
 @login_required
 def edit_user(id):
     if not current_user.is_admin():
         flash('Доступ запрещен! Только администраторы могут редактировать пользователей.', 'error')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
 
-    user = User.query.get_or_404(id)
+    user = User.query.filter_by(id=id, deleted_at=None).first_or_404()
     if request.method == 'POST':
         user.username = request.form['username']
         user.date_of_birth = datetime.strptime(request.form['date_of_birth'], '%Y-%m-%d').date()
@@ -194,247 +296,643 @@ def edit_user(id):
         user.role = request.form['role']
         user.phone = request.form.get('phone', None)
         user.email = request.form.get('email', None)
-        if 'password' in request.form and request.form['password']:
-            user.set_password(request.form['password'])
         try:
+            if 'password' in request.form and request.form['password']:
+                user.set_password(request.form['password'])
             db.session.commit()
+            identity_cache.invalidate(user.id)
+            events.publish('admin', 'user.changed', {'id': user.id})
             flash('Пользователь успешно обновлен!', 'success')
-            return redirect(url_for('users'))
+            return redirect(url_for('main.users'))
         except:
+            db.session.rollback()
             flash('Ошибка при обновлении пользователя!', 'error')
     return render_template('edit_user.html', user=user)
 
 
-@app.route("/delete_user/<int:id>")
+@bp.route("/delete_user/<int:id>")
 @login_required
 def delete_user(id):
     if not current_user.is_admin():
         flash('Доступ запрещен! Только администраторы могут удалять пользователей.', 'error')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
 
-    user = User.query.get_or_404(id)
+    user = User.query.filter_by(id=id, deleted_at=None).first_or_404()
     if user.id == current_user.id:
         flash('Нельзя удалить самого себя!', 'error')
-        return redirect(url_for('users'))
-    try:
-        # Удаляем все заказы пользователя
-        Order.query.filter_by(user_id=user.id).delete()
-        db.session.delete(user)
-        db.session.commit()
-        flash('Пользователь и все его заказы успешно удалены!', 'success')
-    except Exception as e:
-        flash(f'Ошибка при удалении пользователя: {str(e)}', 'error')
-    return redirect(url_for('users'))
+        return redirect(url_for('main.users'))
+    # Пользователь сразу пропадает из списков и не может войти, заказы удаляет фоновая задача
+    user.deleted_at = datetime.utcnow()
+    db.session.commit()
+    identity_cache.invalidate(id)
+    events.publish('admin', 'user.changed', {'id': id})
+    job = job_runner.enqueue('purge_user', current_user.id, user_id=user.id)
+    flash('Пользователь удален, его заказы удаляются в фоне.', 'success')
+    return redirect(url_for('main.job', id=job.id))
 
 
-@app.route("/work_types")
+@bp.route("/work_types")
 @login_required
+@read_replica
 def work_types():
     if not current_user.is_admin():
         flash('Доступ запрещен! Только администраторы могут управлять видами работ.', 'error')
-        return redirect(url_for('profile'))
-    work_types = WorkType.query.all()
+        return redirect(url_for('main.profile'))
+    work_types = WorkType.query.filter(WorkType.deleted_at.is_(None)).all()
     return render_template('work_types.html', work_types=work_types)
 
 
-@app.route("/add_work_type", methods=['GET', 'POST'])
+@bp.route("/add_work_type", methods=['GET', 'POST'])
 @login_required
 def add_work_type():
     if not current_user.is_admin():
         flash('Доступ запрещен! Только администраторы могут добавлять виды работ.', 'error')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
 
     if request.method == 'POST':
         name = request.form['name']
         description = request.form.get('description', '')
         if not name:
             flash('Название вида работы обязательно!', 'error')
-            return redirect(url_for('add_work_type'))
+            return redirect(url_for('main.add_work_type'))
 
         work_type = WorkType(name=name, description=description)
         db.session.add(work_type)
         db.session.commit()
+        catalog_changed('work_type', work_type.id)
         flash('Вид работы успешно добавлен!', 'success')
-        return redirect(url_for('work_types'))
+        return redirect(url_for('main.work_types'))
     return render_template('add_work_type.html')
 
 
-@app.route("/edit_work_type/<int:id>", methods=['GET', 'POST'])
+@bp.route("/edit_work_type/<int:id>", methods=['GET', 'POST'])
 @login_required
 def edit_work_type(id):
     if not current_user.is_admin():
         flash('Доступ запрещен! Только администраторы могут редактировать виды работ.', 'error')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
 
-    work_type = WorkType.query.get_or_404(id)
+    work_type = WorkType.query.filter_by(id=id, deleted_at=None).first_or_404()
     if request.method == 'POST':
         work_type.name = request.form['name']
         work_type.description = request.form.get('description', '')
         if not work_type.name:
             flash('Название вида работы обязательно!', 'error')
-            return redirect(url_for('edit_work_type', id=work_type.id))
+            return redirect(url_for('main.edit_work_type', id=work_type.id))
         try:
             db.session.commit()
+            catalog_changed('work_type', work_type.id)
             flash('Вид работы успешно обновлен!', 'success')
-            return redirect(url_for('work_types'))
+            return redirect(url_for('main.work_types'))
         except:
             flash('Ошибка при обновлении вида работы!', 'error')
     return render_template('edit_work_type.html', work_type=work_type)
 
 
-@app.route("/delete_work_type/<int:id>")
+@bp.route("/delete_work_type/<int:id>")
 @login_required
 def delete_work_type(id):
     if not current_user.is_admin():
         flash('Доступ запрещен! Только администраторы могут удалять виды работ.', 'error')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
 
-    work_type = WorkType.query.get_or_404(id)
+    work_type = WorkType.query.filter_by(id=id, deleted_at=None).first_or_404()
+    # Вид работы сразу пропадает из каталога, заказы по нему удаляет фоновая задача
+    work_type.deleted_at = datetime.utcnow()
+    db.session.commit()
+    catalog_changed('work_type', work_type.id)
+    job = job_runner.enqueue('purge_work_type', current_user.id, work_type_id=work_type.id)
+    flash('Вид работы удален, заказы по нему удаляются в фоне.', 'success')
+    return redirect(url_for('main.job', id=job.id))
+
+
+# Записи заказов выполняются через write_queue, поэтому получают всё через аргументы
+def insert_orders(user_id, bookings):
+    orders = [Order(user_id=user_id, work_type_id=booking['work_type_id'], mechanic_id=booking.get('mechanic_id'),
+                    slot_start=booking.get('slot_start'), slot_end=booking.get('slot_end'))
+              for booking in bookings]
+    db.session.add_all(orders)
+    db.session.flush()
+    # Исполнителя могли удалить, пока подбиралось время. После вставки транзакция уже держит запись,
+    # поэтому удаление либо уже видно здесь, либо само снимет назначение с этих заказов
+    unassigned = db.session.execute(
+        update(Order)
+        .where(Order.id.in_([order.id for order in orders]), Order.mechanic_id.is_not(None),
+               Order.mechanic_id.not_in(select(Mechanic.id)))
+        .values(mechanic_id=None, slot_start=None, slot_end=None)
+        .returning(Order.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    record_orders_created(orders)
+    return [order.id for order in orders], unassigned
+
+
+def mark_orders_paid(user_id, order_ids):
+    # RETURNING отдаёт только реально оплаченные сейчас заказы, по ним и обновляем счётчики
+    paid = db.session.execute(
+        update(Order)
+        .where(Order.id.in_(order_ids), Order.user_id == user_id, Order.is_paid.is_(False))
+        .values(is_paid=True)
+        .returning(Order.created_at, Order.work_type_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    record_orders_paid(paid)
+    return len(paid)
+
+
+def _unassign(order_ids, unassigned, bookings):
+    # Слоты удалённых исполнителей освобождать не нужно: их расписание уже забыто
+    for order_id, booking in zip(order_ids, bookings):
+        if order_id in unassigned:
+            for key in ('mechanic_id', 'mechanic_name', 'slot_start', 'slot_end'):
+                booking.pop(key, None)
+    return order_ids, bookings
+
+
+def book_orders(user_id, requests):
+    # requests — пары (вид работы, желаемое время); возвращает id заказов и назначенные слоты
+    for attempt in range(3):
+        mechanics = scheduler.mechanics()
+        bookings = []
+        for work_type, earliest in requests:
+            slot = scheduler.reserve(work_type, mechanics, earliest) or {}
+            bookings.append(dict(work_type_id=work_type.id, **slot))
+        try:
+            return _unassign(*write_queue.run(insert_orders, user_id, bookings), bookings)
+        except IntegrityError:
+            # Слот успел занять другой процесс: перечитываем расписание этих исполнителей из базы
+            for booking in bookings:
+                if booking.get('mechanic_id'):
+                    scheduler.forget(booking['mechanic_id'])
+        except Exception:
+            for booking in bookings:
+                if booking.get('mechanic_id'):
+                    scheduler.release(booking)
+            raise
+    # Свободное время так и не нашлось: заказ создаётся без исполнителя, его назначит администратор
+    bookings = [{'work_type_id': work_type.id} for work_type, earliest in requests]
+    order_ids, unassigned = write_queue.run(insert_orders, user_id, bookings)
+    return order_ids, bookings
+
+
+def parse_preferred_time(value):
+    if not value:
+        return None
     try:
-        db.session.delete(work_type)
-        db.session.commit()
-        flash('Вид работы успешно удален!', 'success')
-    except:
-        flash('Ошибка при удалении вида работы! Возможно, он используется в заказах.', 'error')
-    return redirect(url_for('work_types'))
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    # Расписание ведётся в местном времени без часового пояса: 10:00+03:00 и ...Z переводим в него
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+def catalog_changed(kind, id):
+    catalog_cache.invalidate()
+    events.publish('catalog', 'catalog.changed', {'kind': kind, 'id': id})
+
+
+def publish_order_event(event_type, user_id, orders):
+    # Владелец получает событие в свой канал, администраторы — в общий
+    data = {'user_id': user_id, 'orders': orders}
+    events.publish(f'user:{user_id}', event_type, data)
+    events.publish('admin', event_type, data)
+
+
+def booked_orders(order_ids, work_type_ids, bookings):
+    return [{'id': order_id, 'work_type_id': work_type_id, 'mechanic_id': booking.get('mechanic_id'),
+             'slot_start': booking['slot_start'].isoformat() if booking.get('slot_start') else None}
+            for order_id, work_type_id, booking in zip(order_ids, work_type_ids, bookings)]
 
 
-@app.route("/create_order/<int:work_type_id>", methods=['POST'])
+@bp.route("/create_order/<int:work_type_id>", methods=['POST'])
 @login_required
 def create_order(work_type_id):
-    work_type = WorkType.query.get_or_404(work_type_id)
-    order = Order(user_id=current_user.id, work_type_id=work_type.id)
-    db.session.add(order)
-    db.session.commit()
-    flash('Заказ успешно создан!', 'success')
-    return redirect(url_for('profile'))
+    work_type = WorkType.query.filter_by(id=work_type_id, deleted_at=None).first_or_404()
+    preferred_time = parse_preferred_time(request.form.get('preferred_time'))
+    order_ids, bookings = book_orders(current_user.id, [(work_type, preferred_time)])
+    publish_order_event('order.created', current_user.id, booked_orders(order_ids, [work_type.id], bookings))
+    booking = bookings[0]
+    if booking.get('mechanic_id'):
+        flash(f"Заказ успешно создан! Исполнитель: {booking['mechanic_name']}, "
+              f"время: {booking['slot_start'].strftime('%Y-%m-%d %H:%M')}", 'success')
+    else:
+        flash('Заказ успешно создан! Исполнителя и время назначит администратор.', 'success')
+    return redirect(url_for('main.profile'))
+
+
+def validate_card(card_number, expiry_date, cvv):
+    if not re.match(r'^\d{16}$', card_number):
+        return 'Номер карты должен содержать 16 цифр!'
+    try:
+        datetime.strptime(expiry_date, '%m/%y')
+    except ValueError:
+        return 'Неверный формат даты истечения срока! Используйте MM/YY.'
+    if not re.match(r'^\d{3}$', cvv):
+        return 'CVV должен содержать 3 цифры!'
+    return None
 
 
-@app.route("/pay_order/<int:order_id>", methods=['GET', 'POST'])
+@bp.route("/pay_order/<int:order_id>", methods=['GET', 'POST'])
 @login_required
 def pay_order(order_id):
     order = Order.query.get_or_404(order_id)
     if order.user_id != current_user.id:
         flash('Доступ запрещен! Это не ваш заказ.', 'error')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
 
     if request.method == 'POST':
-        card_number = request.form['card_number']
-        expiry_date = request.form['expiry_date']
-        cvv = request.form['cvv']
+        error = validate_card(request.form['card_number'], request.form['expiry_date'], request.form['cvv'])
+        if error:
+            flash(error, 'error')
+            return redirect(url_for('main.pay_order', order_id=order.id))
 
-        if not re.match(r'^\d{16}$', card_number):
-            flash('Номер карты должен содержать 16 цифр!', 'error')
-            return redirect(url_for('pay_order', order_id=order.id))
-        try:
-            datetime.strptime(expiry_date, '%m/%y')
-        except ValueError:
-            flash('Неверный формат даты истечения срока! Используйте MM/YY.', 'error')
-            return redirect(url_for('pay_order', order_id=order.id))
-        if not re.match(r'^\d{3}$', cvv):
-            flash('CVV должен содержать 3 цифры!', 'error')
-            return redirect(url_for('pay_order', order_id=order.id))
-
-        order.is_paid = True
-        db.session.commit()
+        write_queue.run(mark_orders_paid, current_user.id, [order.id])
+        publish_order_event('order.paid', current_user.id, [{'id': order.id}])
         flash('Заказ успешно оплачен!', 'success')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
 
     return render_template('pay_order.html', order=order)
 
 
-@app.route("/mechanics")
+# JSON-маршрутам нужен ответ 401, как в api.py, а не перенаправление на страницу входа.
+# Сами маршруты остаются здесь: они пишут через write_queue, а blueprint api читает с реплики
+def api_login_required(view):
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return jsonify({'error': 'Требуется вход'}), 401
+        return view(*args, **kwargs)
+    return decorated
+
+
+def is_id(value):
+    # В JSON true/false — тоже int для Python
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+@bp.route("/api/v1/orders/batch", methods=['POST'])
+@api_login_required
+def create_orders_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Ожидается JSON-объект'}), 400
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Ожидается непустой список items'}), 400
+    if len(items) > current_app.config['BATCH_MAX_ITEMS']:
+        return jsonify({'error': f"Не более {current_app.config['BATCH_MAX_ITEMS']} заказов за один запрос"}), 400
+
+    # Все виды работ проверяем одним запросом
+    work_type_ids = [item.get('work_type_id') if isinstance(item, dict) else None for item in items]
+    known = {w.id: w for w in WorkType.query.filter(WorkType.deleted_at.is_(None), WorkType.id.in_(
+        {i for i in work_type_ids if is_id(i)}))}
+
+    results = []
+    created = []
+    requests = []
+    for index, (item, work_type_id) in enumerate(zip(items, work_type_ids)):
+        if not is_id(work_type_id) or work_type_id not in known:
+            results.append({'index': index, 'status': 'error', 'error': 'Вид работы не найден'})
+            continue
+        result = {'index': index, 'status': 'created', 'work_type_id': work_type_id}
+        created.append(result)
+        results.append(result)
+        requests.append((known[work_type_id], parse_preferred_time(item.get('preferred_time'))))
+
+    # Одна транзакция и один коммит на весь пакет
+    if created:
+        order_ids, bookings = book_orders(current_user.id, requests)
+        publish_order_event('order.created', current_user.id,
+                            booked_orders(order_ids, [w.id for w, _ in requests], bookings))
+        for result, order_id, booking in zip(created, order_ids, bookings):
+            result['order_id'] = order_id
+            result['mechanic_id'] = booking.get('mechanic_id')
+            result['slot_start'] = booking['slot_start'].isoformat() if booking.get('slot_start') else None
+    return jsonify({'created': len(created), 'results': results}), 201 if created else 400
+
+
+@bp.route("/api/v1/orders/pay", methods=['POST'])
+@api_login_required
+def pay_orders_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Ожидается JSON-объект'}), 400
+    order_ids = data.get('order_ids')
+    if not isinstance(order_ids, list) or not order_ids or \
+            not all(is_id(i) for i in order_ids):
+        return jsonify({'error': 'Ожидается непустой список order_ids'}), 400
+    if len(order_ids) > current_app.config['BATCH_MAX_ITEMS']:
+        return jsonify({'error': f"Не более {current_app.config['BATCH_MAX_ITEMS']} заказов за один запрос"}), 400
+
+    error = validate_card(str(data.get('card_number', '')), str(data.get('expiry_date', '')),
+                          str(data.get('cvv', '')))
+    if error:
+        return jsonify({'error': error}), 400
+
+    # Владельца и статус проверяем сразу для всего набора заказов
+    rows = {row.id: row for row in db.session.query(Order.id, Order.user_id, Order.is_paid)
+            .filter(Order.id.in_(order_ids))}
+    results = []
+    payable = []
+    for order_id in dict.fromkeys(order_ids):
+        row = rows.get(order_id)
+        if row is None:
+            results.append({'order_id': order_id, 'status': 'error', 'error': 'Заказ не найден'})
+        elif row.user_id != current_user.id:
+            results.append({'order_id': order_id, 'status': 'error', 'error': 'Это не ваш заказ'})
+        elif row.is_paid:
+            results.append({'order_id': order_id, 'status': 'already_paid'})
+        else:
+            payable.append(order_id)
+            results.append({'order_id': order_id, 'status': 'paid'})
+
+    if payable:
+        write_queue.run(mark_orders_paid, current_user.id, payable)
+        publish_order_event('order.paid', current_user.id, [{'id': order_id} for order_id in payable])
+    return jsonify({'paid': len(payable), 'results': results})
+
+
+@bp.route("/events")
+def event_stream():
+    # Без gevent поток занял бы воркер целиком: отказываем сразу, EventSource после 503 не переподключается
+    if not events.streaming:
+        return Response(status=503)
+    if not current_user.is_authenticated:
+        return Response(status=401)
+    channels = ['catalog', f'user:{current_user.id}']
+    if current_user.is_admin():
+        channels.append('admin')
+    try:
+        subscription = events.subscribe(channels, request.headers.get('Last-Event-ID', type=int))
+    except TooManySubscribers:
+        return Response('retry: 30000\n\n', status=503, mimetype='text/event-stream')
+    keepalive = current_app.config['EVENTS_KEEPALIVE']
+
+    # Генератор не держит контекст запроса и соединение с базой, только очередь подписки
+    def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                event = subscription.get(keepalive)
+                yield format_sse(event) if event else ': keepalive\n\n'
+        finally:
+            subscription.close()
+
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@bp.route("/analytics")
+@login_required
+def analytics():
+    if not current_user.is_admin():
+        flash('Доступ запрещен! Только администраторы могут просматривать аналитику.', 'error')
+        return redirect(url_for('main.profile'))
+    period = 'week' if request.args.get('period') == 'week' else 'day'
+    days = min(max(request.args.get('days', 30, type=int), 1), 366)
+    # Все цифры берутся из дневных счётчиков, таблица order не читается
+    data = dashboard_data(period, days)
+    return render_template('analytics.html', period=period, days=days, **data)
+
+
+@bp.route("/mechanics")
 @login_required
+@read_replica
 def mechanics():
     if not current_user.is_admin():
         flash('Доступ запрещен! Только администраторы могут управлять исполнителями.', 'error')
-        return redirect(url_for('profile'))
-    mechanics = Mechanic.query.all()
-    return render_template('mechanics.html', mechanics=mechanics)
+        return redirect(url_for('main.profile'))
+    q = clean_query(request.args.get('q', ''))
+    sort = request.args.get('sort', 'name')
+    direction = request.args.get('direction', 'asc')
+    page = request.args.get('page', 1, type=int)
+
+    column = MECHANIC_SORT_COLUMNS.get(sort, Mechanic.name)
+    query = Mechanic.query
+    if q:
+        query = query.filter(search_filter(db, Mechanic, q))
+    query = query.order_by(column.desc() if direction == 'desc' else column.asc(), Mechanic.id)
+    pagination = query.paginate(page=page, per_page=current_app.config['ADMIN_PER_PAGE'], error_out=False)
+    return render_template('mechanics.html', mechanics=pagination.items, pagination=pagination,
+                           q=q, sort=sort, direction=direction)
+
+
+@bp.route("/export/<kind>")
+@login_required
+def export(kind):
+    if not current_user.is_admin():
+        flash('Доступ запрещен! Только администраторы могут выгружать данные.', 'error')
+        return redirect(url_for('main.profile'))
+    fmt = request.args.get('format', 'csv')
+    if kind not in EXPORT_QUERIES or fmt not in EXPORT_FORMATS:
+        abort(404)
+    # Ответ отдаётся по частям, пока курсор читает таблицу
+    chunks = export_chunks(kind, fmt, current_app.config['EXPORT_CHUNK_SIZE'])
+    response = Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt])
+    filename = f'{kind}-{datetime.now():%Y%m%d-%H%M%S}.{fmt}'
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@bp.route("/import/<kind>", methods=['GET', 'POST'])
+@login_required
+def import_data(kind):
+    if not current_user.is_admin():
+        flash('Доступ запрещен! Только администраторы могут импортировать данные.', 'error')
+        return redirect(url_for('main.profile'))
+    if kind not in IMPORTERS:
+        abort(404)
+
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Выберите файл для импорта!', 'error')
+            return redirect(url_for('main.import_data', kind=kind))
+        fmt = 'ndjson' if upload.filename.lower().endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+        # Файл сохраняется на диск, строки проверяет и вставляет фоновая задача
+        folder = os.path.join(current_app.instance_path, 'imports')
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f'{uuid.uuid4().hex}.{fmt}')
+        upload.save(path)
+        job = job_runner.enqueue('import', current_user.id, entity=kind, path=path, format=fmt)
+        return redirect(url_for('main.job', id=job.id))
+    return render_template('import.html', kind=kind, columns=IMPORT_COLUMNS[kind])
+
+
+@bp.route("/jobs")
+@login_required
+def jobs():
+    if not current_user.is_admin():
+        flash('Доступ запрещен! Только администраторы могут просматривать фоновые задачи.', 'error')
+        return redirect(url_for('main.profile'))
+    job_runner.recover()
+    jobs = Job.query.order_by(Job.id.desc()).limit(current_app.config['ADMIN_PER_PAGE']).all()
+    return render_template('jobs.html', jobs=jobs)
+
+
+@bp.route("/jobs/<int:id>")
+@login_required
+def job(id):
+    if not current_user.is_admin():
+        flash('Доступ запрещен! Только администраторы могут просматривать фоновые задачи.', 'error')
+        return redirect(url_for('main.profile'))
+    job = Job.query.get_or_404(id)
+    result = json.loads(job.result) if job.result else {}
+    return render_template('job.html', job=job, result=result)
+
+
+@bp.route("/jobs/archive_orders", methods=['POST'])
+@login_required
+def archive_orders():
+    if not current_user.is_admin():
+        flash('Доступ запрещен! Только администраторы могут архивировать заказы.', 'error')
+        return redirect(url_for('main.profile'))
+    job = job_runner.enqueue('archive_orders', current_user.id, before=order_archive.horizon().isoformat())
+    return redirect(url_for('main.job', id=job.id))
 
 
-@app.route("/add_mechanic", methods=['GET', 'POST'])
+@bp.route("/jobs/<int:id>/retry", methods=['POST'])
+@login_required
+def retry_job(id):
+    if not current_user.is_admin():
+        flash('Доступ запрещен! Только администраторы могут перезапускать фоновые задачи.', 'error')
+        return redirect(url_for('main.profile'))
+    job = Job.query.get_or_404(id)
+    # Импорт не повторяем: файл удаляется после первой попытки
+    if job.status != 'failed' or job.kind == 'import':
+        flash('Эту задачу нельзя перезапустить.', 'error')
+    else:
+        job_runner.retry(job)
+        flash('Задача перезапущена.', 'success')
+    return redirect(url_for('main.job', id=job.id))
+
+
+@bp.route("/add_mechanic", methods=['GET', 'POST'])
 @login_required
 def add_mechanic():
     if not current_user.is_admin():
         flash('Доступ запрещен! Только администраторы могут добавлять исполнителей.', 'error')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
 
     if request.method == 'POST':
         name = request.form['name']
         phone = request.form.get('phone', '')
         specialization = request.form.get('specialization', '')
-        if not name:
-            flash('Имя исполнителя обязательно!', 'error')
-            return redirect(url_for('add_mechanic'))
-        if phone and not re.match(r'^\d{10}$', phone):
-            flash('Номер телефона должен содержать ровно 10 цифр!', 'error')
-            return redirect(url_for('add_mechanic'))
+        error = validate_mechanic(name, phone)
+        if error:
+            flash(error, 'error')
+            return redirect(url_for('main.add_mechanic'))
 
         mechanic = Mechanic(name=name, phone=phone if phone else None, specialization=specialization)
         db.session.add(mechanic)
         db.session.commit()
+        catalog_changed('mechanic', mechanic.id)
         flash('Исполнитель успешно добавлен!', 'success')
-        return redirect(url_for('mechanics'))
+        return redirect(url_for('main.mechanics'))
     return render_template('add_mechanic.html')
 
 
-@app.route("/edit_mechanic/<int:id>", methods=['GET', 'POST'])
+@bp.route("/edit_mechanic/<int:id>", methods=['GET', 'POST'])
 @login_required
 def edit_mechanic(id):
     if not current_user.is_admin():
         flash('Доступ запрещен! Только администраторы могут редактировать исполнителей.', 'error')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
 
     mechanic = Mechanic.query.get_or_404(id)
     if request.method == 'POST':
         mechanic.name = request.form['name']
         mechanic.phone = request.form.get('phone', None)
         mechanic.specialization = request.form.get('specialization', '')
-        if not mechanic.name:
-            flash('Имя исполнителя обязательно!', 'error')
-            return redirect(url_for('edit_mechanic', id=mechanic.id))
-        if mechanic.phone and not re.match(r'^\d{10}$', mechanic.phone):
-            flash('Номер телефона должен содержать ровно 10 цифр!', 'error')
-            return redirect(url_for('edit_mechanic', id=mechanic.id))
+        error = validate_mechanic(mechanic.name, mechanic.phone)
+        if error:
+            flash(error, 'error')
+            return redirect(url_for('main.edit_mechanic', id=mechanic.id))
         try:
             db.session.commit()
+            catalog_changed('mechanic', mechanic.id)
             flash('Исполнитель успешно обновлен!', 'success')
-            return redirect(url_for('mechanics'))
+            return redirect(url_for('main.mechanics'))
         except:
             flash('Ошибка при обновлении исполнителя!', 'error')
     return render_template('edit_mechanic.html', mechanic=mechanic)
 
 
-@app.route("/delete_mechanic/<int:id>")
+@bp.route("/delete_mechanic/<int:id>")
 @login_required
 def delete_mechanic(id):
     if not current_user.is_admin():
         flash('Доступ запрещен! Только администраторы могут удалять исполнителей.', 'error')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
 
     mechanic = Mechanic.query.get_or_404(id)
     try:
+        # Архив может быть отдельным соединением к той же SQLite: фиксируем его до записи в основную базу
+        ArchivedOrder.query.filter_by(mechanic_id=mechanic.id) \
+            .update({ArchivedOrder.mechanic_id: None}, synchronize_session=False)
+        db.session.commit()
+        # Заказы исполнителя остаются без назначения, их время переназначит администратор
+        Order.query.filter_by(mechanic_id=mechanic.id).update({Order.mechanic_id: None}, synchronize_session=False)
         db.session.delete(mechanic)
         db.session.commit()
+        scheduler.forget(id)
+        catalog_changed('mechanic', id)
         flash('Исполнитель успешно удален!', 'success')
     except:
         flash('Ошибка при удалении исполнителя!', 'error')
-    return redirect(url_for('mechanics'))
+    return redirect(url_for('main.mechanics'))
 
 
-@app.route("/index")
-@app.route("/")
+# Без read_replica: записи кэша каталога строятся из основной базы, иначе после правки
+# в кэш под новой версией попал бы устаревший каталог с отстающей реплики
+@bp.route("/index")
+@bp.route("/")
 def index():
-    work_types = WorkType.query.all()
-    mechanics = Mechanic.query.all()  # Добавляем список исполнителей
-    return render_template('index.html', work_types=work_types, mechanics=mechanics)
-
-
-@app.route("/about")
+    version = catalog_cache.state()[0]
+    # Страница зависит от каталога, от версии кода и шаблонов и от того, кто её смотрит (меню и кнопки заказа).
+    # Last-Modified не отправляем: время правки каталога не учитывает деплой
+    audience = 'admin' if current_user.is_authenticated and current_user.is_admin() else \
+        'user' if current_user.is_authenticated else 'anon'
+    release = current_app.config['RELEASE_ID']
+    etag = hashlib.sha1(f'{version}:{release}:{audience}'.encode()).hexdigest()
+
+    if not is_resource_modified(request.environ, etag=etag):
+        response = make_response('', 304)
+    else:
+        work_types = catalog_cache.get_or_set('work_types', lambda: [
+            {'id': w.id, 'name': w.name, 'description': w.description}
+            for w in WorkType.query.filter(WorkType.deleted_at.is_(None))
+        ], version)
+        mechanics = catalog_cache.get_or_set('mechanics', lambda: [
+            {'id': m.id, 'name': m.name, 'phone': m.phone, 'specialization': m.specialization}
+            for m in Mechanic.query.all()
+        ], version)
+        authenticated = current_user.is_authenticated
+        catalog_html = catalog_cache.get_or_set(
+            f"fragment:{release}:{'auth' if authenticated else 'anon'}",
+            lambda: render_template('_catalog.html', work_types=work_types, mechanics=mechanics,
+                                    authenticated=authenticated),
+            version)
+        response = make_response(render_template('index.html', catalog_html=catalog_html))
+
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    if audience == 'anon':
+        response.cache_control.public = True
+    else:
+        response.cache_control.private = True
+    response.vary.add('Cookie')
+    return response
+
+
+@bp.route("/about")
 def about():
     return render_template('about.html')
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, func, insert, or_, select, text
+
+from config import db, Order, ArchivedOrder
+from database import ARCHIVE_BIND
+
+# Колонки, которые переносятся в архив как есть
+ARCHIVE_COLUMNS = [column.name for column in Order.__table__.columns]
+
+
+class ArchiveConflict(Exception):
+    pass
+
+
+# Архив старых заказов. В основной таблице остаются неоплаченные и свежие заказы,
+# поэтому её размер и индексы не растут с годами. Архивная таблица читается,
+# только когда страница истории доходит до заказов старше горизонта архивации.
+class OrderArchive:
+    def __init__(self):
+        self.after_days = 365
+
+    def init_app(self, app):
+        self.after_days = app.config.get('ORDER_ARCHIVE_AFTER_DAYS', self.after_days)
+
+    def horizon(self):
+        # Всё, что лежит в архиве, создано раньше этого момента
+        return datetime.utcnow() - timedelta(days=self.after_days)
+
+    def create_table(self):
+        db.create_all(bind_key=ARCHIVE_BIND)
+
+    def reserve_ids(self):
+        # Счётчик AUTOINCREMENT не должен отставать от архива, иначе новый заказ получит id архивного
+        # (архив в отдельной базе миграция не видит)
+        if db.engine.dialect.name != 'sqlite':
+            return
+        top = db.session.query(func.max(ArchivedOrder.id)).scalar()
+        if top is None:
+            return
+        db.session.execute(text("UPDATE sqlite_sequence SET seq = :top WHERE name = 'order' AND seq < :top"),
+                           {'top': top})
+        db.session.execute(text("INSERT INTO sqlite_sequence (name, seq) SELECT 'order', :top "
+                                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'order')"),
+                           {'top': top})
+        db.session.commit()
+
+    def archivable(self, before, now):
+        # Слот уже прошёл: расписанию исполнителей архивные заказы не нужны
+        return and_(Order.is_paid.is_(True), Order.created_at < before,
+                    or_(Order.slot_end.is_(None), Order.slot_end < now))
+
+    def count(self, condition):
+        return db.session.query(func.count(Order.id)).filter(condition).scalar()
+
+    def move(self, condition, limit):
+        rows = db.session.execute(
+            select(*[Order.__table__.c[name] for name in ARCHIVE_COLUMNS])
+            .where(condition).order_by(Order.id).limit(limit)).all()
+        if not rows:
+            return 0
+        ids = [row.id for row in rows]
+        now = datetime.utcnow()
+        # Архив может быть другой базой (или другим соединением к той же SQLite), поэтому
+        # сначала фиксируем копию, потом удаляем оригиналы. После сбоя между коммитами
+        # уже скопированные заказы не вставляются повторно; строка архива с тем же id,
+        # но другим заказом — ошибка, архивные данные не перезаписываются.
+        existing = {row.id: (row.user_id, row.created_at) for row in db.session.execute(
+            select(ArchivedOrder.id, ArchivedOrder.user_id, ArchivedOrder.created_at)
+            .where(ArchivedOrder.id.in_(ids)))}
+        conflicts = [row.id for row in rows
+                     if row.id in existing and existing[row.id] != (row.user_id, row.created_at)]
+        if conflicts:
+            db.session.rollback()
+            raise ArchiveConflict(f"В архиве уже есть другие заказы с id: {', '.join(map(str, conflicts))}")
+        copies = [dict(row._mapping, archived_at=now) for row in rows if row.id not in existing]
+        if copies:
+            db.session.execute(insert(ArchivedOrder), copies)
+        db.session.commit()
+        db.session.execute(delete(Order).where(Order.id.in_(ids)))
+        db.session.commit()
+        return len(rows)
+
+    def needs_archive(self, rows, limit, created_at):
+        # rows — выборка из основной таблицы с limit + 1 строками. Если страница заполнена
+        # заказами новее горизонта, архивные заказы на неё попасть не могут.
+        return len(rows) <= limit or created_at(rows[limit - 1]) < self.horizon()
+
+    def merge(self, rows, archived, limit, key, reverse=True):
+        # key задаёт порядок и одновременно отличает заказы: отстающая реплика ещё может
+        # отдавать перенесённый заказ из основной таблицы, такой дубль схлопывается
+        unique = {key(row): row for row in archived + rows}
+        return sorted(unique.values(), key=key, reverse=reverse)[:limit + 1]
+
+
+order_archive = OrderArchive()
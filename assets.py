@@ -0,0 +1,190 @@
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+
+from flask import current_app, request, send_from_directory, url_for
+from markupsafe import Markup, escape
+
+BUILD_DIR = 'build'
+MANIFEST = 'manifest.json'
+# Сжимаем только текстовые форматы: jpg/png/webp уже сжаты
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+IMAGES = ('.jpg', '.jpeg', '.png')
+# Формат Pillow и MIME-тип для адаптивных вариантов картинок, в порядке предпочтения
+IMAGE_FORMATS = (('avif', 'AVIF', 'image/avif'), ('webp', 'WEBP', 'image/webp'))
+
+
+def _fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _compressors():
+    compressors = {'gzip': ('.gz', lambda data: gzip.compress(data, 9, mtime=0))}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        compressors['br'] = ('.br', lambda data: brotli.compress(data, quality=11))
+    return compressors
+
+
+def _image_formats():
+    try:
+        from PIL import features
+    except ImportError:
+        return []
+    try:
+        import pillow_avif  # noqa: F401 — для Pillow без встроенной поддержки AVIF
+    except ImportError:
+        pass
+    return [fmt for fmt in IMAGE_FORMATS if features.check(fmt[0])]
+
+
+def _resize(source, width, pil_format):
+    from PIL import Image
+    with Image.open(source) as image:
+        height = round(image.height * width / image.width)
+        resized = image.convert('RGB').resize((width, height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(buffer, pil_format, quality=80)
+        return buffer.getvalue()
+
+
+def _image_width(source):
+    from PIL import Image
+    with Image.open(source) as image:
+        return image.width
+
+
+# Сборка и раздача статики: имена с хэшем содержимого, заранее сжатые копии и WebP/AVIF-варианты картинок
+class Assets:
+    def __init__(self):
+        self.files = {}
+        self.encodings = {}
+        self.images = {}
+        self.build_id = ''
+        self.max_age = 365 * 24 * 3600
+
+    def init_app(self, app):
+        self.max_age = app.config.get('ASSETS_MAX_AGE', self.max_age)
+        self.load(app)
+        # Без собранного манифеста url_for('static') и раздача работают как обычно
+        app.url_defaults(self._fingerprinted_url)
+        app.view_functions['static'] = self.static_view
+        app.jinja_env.globals['responsive_image'] = self.responsive_image
+
+    def load(self, app):
+        path = os.path.join(app.static_folder, BUILD_DIR, MANIFEST)
+        if not os.path.exists(path):
+            self.files, self.encodings, self.images = {}, {}, {}
+            self.build_id = ''
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        manifest = json.loads(data)
+        self.build_id = _fingerprint(data)
+        self.files = manifest['files']
+        self.encodings = manifest['encodings']
+        self.images = manifest['images']
+
+    def _fingerprinted_url(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.files:
+            values['filename'] = self.files[values['filename']]
+
+    def build(self, app):
+        static = app.static_folder
+        build = os.path.join(static, BUILD_DIR)
+        compressors = _compressors()
+        image_formats = _image_formats()
+        widths = app.config.get('ASSETS_IMAGE_WIDTHS', ())
+        files, encodings, images = {}, {}, {}
+
+        # Старые файлы не удаляются: страницы из кэша клиентов могут ещё ссылаться на прошлую сборку
+        for root, dirs, names in os.walk(static):
+            if os.path.abspath(root) == os.path.abspath(build):
+                dirs[:] = []
+                continue
+            for name in sorted(names):
+                source = os.path.join(root, name)
+                logical = os.path.relpath(source, static).replace(os.sep, '/')
+                with open(source, 'rb') as f:
+                    data = f.read()
+                digest = _fingerprint(data)
+                stem, ext = os.path.splitext(logical)
+                target = f'{BUILD_DIR}/{stem}.{digest}{ext}'
+                _write(os.path.join(static, target), data)
+                files[logical] = target
+
+                if ext.lower() in COMPRESSIBLE:
+                    for encoding, (suffix, compress) in compressors.items():
+                        compressed = compress(data)
+                        if len(compressed) < len(data) * 0.9:
+                            _write(os.path.join(static, target + suffix), compressed)
+                            encodings.setdefault(target, []).append(encoding)
+
+                if ext.lower() in IMAGES and image_formats:
+                    # Ширины больше исходной не делаем: увеличенная картинка только тяжелее
+                    original_width = _image_width(source)
+                    sizes = sorted({min(width, original_width) for width in widths or [original_width]})
+                    variants = {}
+                    for fmt, pil_format, mimetype in image_formats:
+                        variants[mimetype] = []
+                        for width in sizes:
+                            variant = f'{BUILD_DIR}/{stem}.{digest}.{width}w.{fmt}'
+                            _write(os.path.join(static, variant), _resize(source, width, pil_format))
+                            variants[mimetype].append([width, variant])
+                    images[logical] = variants
+
+        manifest = {'files': files, 'encodings': encodings, 'images': images}
+        _write(os.path.join(build, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+        self.files, self.encodings, self.images = files, encodings, images
+        return manifest
+
+    def static_view(self, filename):
+        if not filename.startswith(BUILD_DIR + '/'):
+            return current_app.send_static_file(filename)
+        # Имя содержит хэш содержимого, поэтому файл можно кэшировать навсегда
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = next((e for e in ('br', 'gzip') if e in self.encodings.get(filename, ())
+                         and request.accept_encodings[e]), None)
+        if encoding:
+            suffix = '.br' if encoding == 'br' else '.gz'
+            response = send_from_directory(current_app.static_folder, filename + suffix,
+                                           mimetype=mimetype, max_age=self.max_age)
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = send_from_directory(current_app.static_folder, filename,
+                                           mimetype=mimetype, max_age=self.max_age)
+        if filename in self.encodings:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    def responsive_image(self, filename, alt='', class_=None, sizes=None):
+        # Браузер сам выбирает формат (AVIF, WebP) и ширину из <picture>
+        attrs = f' class="{escape(class_)}"' if class_ else ''
+        img = f'<img{attrs} src="{escape(url_for("static", filename=filename))}" alt="{escape(alt)}">'
+        variants = self.images.get(filename)
+        if not variants:
+            return Markup(img)
+        sizes_attr = f' sizes="{escape(sizes)}"' if sizes else ''
+        sources = ''.join(
+            f'<source type="{mimetype}" srcset="'
+            + ', '.join(f'{escape(url_for("static", filename=path))} {width}w' for width, path in candidates)
+            + f'"{sizes_attr}>'
+            for mimetype, candidates in variants.items())
+        return Markup(f'<picture>{sources}{img}</picture>')
+
+
+assets = Assets()
@@ -0,0 +1,397 @@
+"""Нагрузочный прогон всех маршрутов приложения.
+
+Создаёт отдельную базу SQLite, заполняет её заданным объёмом данных и гоняет по маршрутам
+несколько параллельных виртуальных пользователей через тестовый клиент Flask.
+Для каждого маршрута считаются p50/p95/p99, пропускная способность и число SQL-запросов
+на запрос (из заголовка Server-Timing):
+
+    python benchmarks/load.py --users 10000 --orders 100000 --concurrency 8 --duration 30 --output run.json
+    python benchmarks/load.py --baseline run.json --tolerance 0.25
+"""
+import argparse
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import func, insert  # noqa: E402
+
+from app import create_app  # noqa: E402
+from commands import init_db, seed_db  # noqa: E402
+from config import db, User, WorkType, Order, Mechanic, Job  # noqa: E402
+
+PASSWORD = 'bench-password'
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+def seed_volume(app, users, orders, work_types, mechanics, batch=5000):
+    # Массовая вставка через executemany; хэш пароля один на всех, чтобы не считать его 100 000 раз
+    rng = random.Random(42)
+    with app.app_context():
+        init_db()
+        seed_db()
+        for start in range(0, work_types, batch):
+            db.session.execute(insert(WorkType), [
+                {'name': f'Работа {i}', 'description': f'Описание вида работы {i}'}
+                for i in range(start, min(start + batch, work_types))
+            ])
+        for start in range(0, mechanics, batch):
+            db.session.execute(insert(Mechanic), [
+                {'name': f'Исполнитель {i}', 'phone': f'{i:010d}', 'specialization': f'Работа {i % max(work_types, 1)}'}
+                for i in range(start, min(start + batch, mechanics))
+            ])
+        probe = User()
+        probe.set_password(PASSWORD)
+        bench_hash = probe.password_hash
+        for start in range(0, users, batch):
+            db.session.execute(insert(User), [
+                {'username': f'bench{i}', 'password_hash': bench_hash, 'date_of_birth': date(1990, 1, 1),
+                 'gender': 'male', 'role': 'user', 'phone': f'9{i:09d}', 'email': f'bench{i}@example.com'}
+                for i in range(start, min(start + batch, users))
+            ])
+        db.session.commit()
+
+        user_ids = [row.id for row in db.session.query(User.id).filter(User.username.like('bench%'))]
+        work_type_ids = [row.id for row in db.session.query(WorkType.id)]
+        now = datetime.utcnow()
+        for start in range(0, orders, batch):
+            db.session.execute(insert(Order), [
+                {'user_id': rng.choice(user_ids), 'work_type_id': rng.choice(work_type_ids),
+                 'created_at': now - timedelta(minutes=rng.randrange(60 * 24 * 365)),
+                 'is_paid': rng.random() < 0.7}
+                for _ in range(start, min(start + batch, orders))
+            ])
+        db.session.commit()
+        return user_ids
+
+
+class Stats:
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, name, elapsed, response, ok_statuses):
+        header = ', '.join(response.headers.getlist('Server-Timing'))
+        match = QUERIES_RE.search(header)
+        with self._lock:
+            self.latency[name].append(elapsed)
+            if match:
+                self.queries[name].append(int(match.group(1)))
+            if response.status_code not in ok_statuses:
+                self.errors[name] += 1
+
+
+class VirtualUser:
+    def __init__(self, app, stats, username, password, rng):
+        self.app = app
+        self.stats = stats
+        self.client = app.test_client()
+        self.username = username
+        self.password = password
+        self.rng = rng
+        self.user_id = None
+
+    def request(self, name, method, url, ok=(200, 302, 304), **kwargs):
+        start = time.perf_counter()
+        response = self.client.open(url, method=method, **kwargs)
+        self.stats.record(name, time.perf_counter() - start, response, ok)
+        return response
+
+    def login(self):
+        self.request('login', 'POST', '/login', data={'username': self.username, 'password': self.password},
+                     ok=(302,))
+        with self.app.app_context():
+            self.user_id = db.session.query(User.id).filter_by(username=self.username).scalar()
+
+    def unpaid_order(self):
+        with self.app.app_context():
+            return db.session.query(Order.id).filter_by(user_id=self.user_id, is_paid=False) \
+                .order_by(Order.id.desc()).limit(1).scalar()
+
+    def tasks(self):
+        return [
+            (30, self.index),
+            (25, self.profile),
+            (10, self.create_order),
+            (10, self.pay_order),
+            (5, self.batch_orders),
+            (5, self.api_catalog),
+            (5, self.api_orders),
+            (3, self.register),
+            (2, self.relogin),
+            (2, self.about),
+        ]
+
+    def index(self):
+        self.request('index', 'GET', '/')
+
+    def about(self):
+        self.request('about', 'GET', '/about')
+
+    def profile(self):
+        status = self.rng.choice(['', 'paid', 'unpaid'])
+        response = self.request('profile', 'GET', '/profile', query_string={'status': status} if status else None)
+        match = re.search(rb'cursor=([^"&]+)', response.data)
+        if match:
+            self.request('profile_next_page', 'GET', '/profile?cursor=' + match.group(1).decode())
+
+    def create_order(self):
+        self.request('create_order', 'POST', f'/create_order/{self.rng.randint(1, 4)}', ok=(302,))
+
+    def batch_orders(self):
+        items = [{'work_type_id': self.rng.randint(1, 4)} for _ in range(self.rng.randint(2, 20))]
+        response = self.request('orders_batch', 'POST', '/api/v1/orders/batch', ok=(201,), json={'items': items})
+        order_ids = [r['order_id'] for r in response.get_json()['results'] if 'order_id' in r] \
+            if response.status_code == 201 else []
+        if order_ids:
+            self.request('orders_pay', 'POST', '/api/v1/orders/pay', json={
+                'order_ids': order_ids, 'card_number': '4' * 16, 'expiry_date': '12/30', 'cvv': '123'})
+
+    def api_catalog(self):
+        self.request('api_work_types', 'GET', '/api/v1/work_types')
+        self.request('api_work_type', 'GET', f'/api/v1/work_types/{self.rng.randint(1, 4)}', ok=(200, 304))
+        response = self.request('api_mechanics', 'GET', '/api/v1/mechanics', query_string={'limit': 20})
+        items = response.get_json()['data'] if response.status_code == 200 else []
+        if items:
+            self.request('api_mechanic', 'GET', f"/api/v1/mechanics/{self.rng.choice(items)['id']}", ok=(200, 304))
+
+    def api_orders(self):
+        response = self.request('api_orders', 'GET', '/api/v1/orders', query_string={'limit': 20})
+        items = response.get_json()['data'] if response.status_code == 200 else []
+        if items:
+            self.request('api_order', 'GET', f"/api/v1/orders/{self.rng.choice(items)['id']}", ok=(200, 304))
+
+    def relogin(self):
+        self.request('logout', 'GET', '/logout', ok=(302,))
+        self.login()
+
+    def pay_order(self):
+        order_id = self.unpaid_order()
+        if order_id is None:
+            return
+        self.request('pay_order_form', 'GET', f'/pay_order/{order_id}')
+        self.request('pay_order', 'POST', f'/pay_order/{order_id}', ok=(302,),
+                     data={'card_number': '4' * 16, 'expiry_date': '12/30', 'cvv': '123'})
+
+    def register(self):
+        suffix = f'{threading.get_ident()}{time.perf_counter_ns()}'
+        self.request('register', 'POST', '/register', ok=(302,), data={
+            'username': f'new{suffix}', 'password': 'secret123', 'date_of_birth': '1990-01-01',
+            'gender': 'other', 'phone': '', 'email': ''})
+
+    def run(self, deadline):
+        self.login()
+        weights, tasks = zip(*self.tasks())
+        while time.perf_counter() < deadline:
+            self.rng.choices(tasks, weights)[0]()
+
+
+class AdminUser(VirtualUser):
+    def tasks(self):
+        return [
+            (20, self.users),
+            (10, self.search_users),
+            (15, self.mechanics),
+            (15, self.work_types),
+            (5, self.user_crud),
+            (5, self.work_type_crud),
+            (5, self.mechanic_crud),
+            (5, self.analytics),
+            (5, self.jobs),
+            (3, self.metrics),
+            (2, self.export),
+            (2, self.import_mechanics),
+        ]
+
+    def users(self):
+        self.request('users', 'GET', '/users', query_string={'page': self.rng.randint(1, 20)})
+
+    def search_users(self):
+        self.request('users_search', 'GET', '/users', query_string={'q': f'bench{self.rng.randint(1, 999)}'})
+
+    def mechanics(self):
+        self.request('mechanics', 'GET', '/mechanics', query_string={'q': self.rng.choice(['', 'Работа 1'])})
+
+    def work_types(self):
+        self.request('work_types', 'GET', '/work_types')
+
+    def user_crud(self):
+        # Отдельный пользователь на каждый прогон: правка и удаление не задевают виртуальных пользователей
+        username = f'bench-edit{time.perf_counter_ns()}'
+        with self.app.app_context():
+            user_id = db.session.execute(insert(User).returning(User.id), {
+                'username': username, 'password_hash': '-', 'date_of_birth': date(1990, 1, 1),
+                'gender': 'other', 'role': 'user'}).scalar()
+            db.session.commit()
+        self.request('edit_user_form', 'GET', f'/edit_user/{user_id}')
+        self.request('edit_user', 'POST', f'/edit_user/{user_id}', ok=(302,), data={
+            'username': username, 'date_of_birth': '1991-02-03', 'gender': 'other', 'role': 'user',
+            'phone': '5555555555', 'email': f'{username}@example.com', 'password': ''})
+        self.request('delete_user', 'GET', f'/delete_user/{user_id}', ok=(302,))
+
+    def work_type_crud(self):
+        name = f'Бенчмарк {time.perf_counter_ns()}'
+        self.request('add_work_type', 'POST', '/add_work_type', ok=(302,), data={'name': name, 'description': '-'})
+        with self.app.app_context():
+            work_type_id = db.session.query(WorkType.id).filter_by(name=name).scalar()
+        self.request('edit_work_type', 'POST', f'/edit_work_type/{work_type_id}', ok=(302,),
+                     data={'name': name + ' (изм.)', 'description': '-'})
+        self.request('delete_work_type', 'GET', f'/delete_work_type/{work_type_id}', ok=(302,))
+
+    def analytics(self):
+        self.request('analytics', 'GET', '/analytics', query_string={'period': self.rng.choice(['day', 'week'])})
+
+    def jobs(self):
+        self.request('jobs', 'GET', '/jobs')
+        with self.app.app_context():
+            job_id = db.session.query(func.max(Job.id)).scalar()
+        if job_id:
+            self.request('job', 'GET', f'/jobs/{job_id}')
+
+    def metrics(self):
+        self.request('metrics', 'GET', '/metrics')
+
+    def export(self):
+        # buffered: время включает выгрузку всего потока, а не только первый ответ
+        kind = self.rng.choice(['users', 'mechanics', 'orders'])
+        self.request(f'export_{kind}', 'GET', f'/export/{kind}', buffered=True)
+
+    def import_mechanics(self):
+        self.request('import_form', 'GET', '/import/mechanics')
+        suffix = time.perf_counter_ns()
+        rows = ''.join(f'Импорт {suffix}-{i},5555555555,Замена шин\n' for i in range(20))
+        response = self.request('import', 'POST', '/import/mechanics', ok=(302,), data={
+            'file': (io.BytesIO(f'name,phone,specialization\n{rows}'.encode()), 'mechanics.csv')})
+        if response.location:
+            self.request('import_job', 'GET', response.location)
+
+    def mechanic_crud(self):
+        name = f'Бенчмарк {time.perf_counter_ns()}'
+        self.request('add_mechanic', 'POST', '/add_mechanic', ok=(302,),
+                     data={'name': name, 'phone': '5555555555', 'specialization': 'Замена шин'})
+        with self.app.app_context():
+            mechanic_id = db.session.query(Mechanic.id).filter_by(name=name).scalar()
+        self.request('edit_mechanic', 'POST', f'/edit_mechanic/{mechanic_id}', ok=(302,),
+                     data={'name': name, 'phone': '5555555556', 'specialization': 'Замена шин'})
+        self.request('delete_mechanic', 'GET', f'/delete_mechanic/{mechanic_id}', ok=(302,))
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(stats, elapsed):
+    routes = {}
+    for name, values in sorted(stats.latency.items()):
+        queries = stats.queries.get(name)
+        routes[name] = {
+            'requests': len(values),
+            'errors': stats.errors.get(name, 0),
+            'throughput': len(values) / elapsed,
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+            'queries_per_request': sum(queries) / len(queries) if queries else None,
+        }
+    total = sum(r['requests'] for r in routes.values())
+    return {'duration': elapsed, 'requests': total, 'throughput': total / elapsed, 'routes': routes}
+
+
+def compare(current, baseline, tolerance):
+    regressions = []
+    for name, route in current['routes'].items():
+        previous = baseline['routes'].get(name)
+        if not previous:
+            continue
+        if route['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.1f} -> {route['p95_ms']:.1f} ms")
+        if previous['queries_per_request'] is not None and route['queries_per_request'] is not None and \
+                route['queries_per_request'] > previous['queries_per_request'] + 0.5:
+            regressions.append(f"{name}: SQL-запросов {previous['queries_per_request']:.1f} -> "
+                               f"{route['queries_per_request']:.1f}")
+    if current['throughput'] < baseline['throughput'] * (1 - tolerance):
+        regressions.append(f"throughput {baseline['throughput']:.1f} -> {current['throughput']:.1f} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон всех маршрутов')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--work-types', type=int, default=20)
+    parser.add_argument('--mechanics', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=8, help='число виртуальных пользователей')
+    parser.add_argument('--admins', type=int, default=1, help='сколько из них администраторы')
+    parser.add_argument('--duration', type=float, default=20, help='длительность прогона, секунды')
+    parser.add_argument('--database', help='файл SQLite (по умолчанию временный)')
+    parser.add_argument('--output', help='сохранить результат в JSON')
+    parser.add_argument('--baseline', help='JSON предыдущего прогона для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимое ухудшение (доля)')
+    args = parser.parse_args()
+
+    database = args.database or os.path.join(tempfile.mkdtemp(prefix='praktika-bench-'), 'bench.db')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + database,
+        'METRICS_SERVER_TIMING': True,
+        'LOGIN_MAX_ATTEMPTS': 1000000,
+    })
+    print(f'Заполнение {database} ...')
+    started = time.perf_counter()
+    user_ids = seed_volume(app, args.users, args.orders, args.work_types, args.mechanics)
+    print(f'Готово за {time.perf_counter() - started:.1f} с')
+
+    stats = Stats()
+    rng = random.Random(7)
+    virtual_users = []
+    for i in range(args.concurrency):
+        if i < args.admins:
+            virtual_users.append(AdminUser(app, stats, 'admin', 'admin123', random.Random(rng.random())))
+        else:
+            username = f'bench{rng.randrange(len(user_ids))}'
+            virtual_users.append(VirtualUser(app, stats, username, PASSWORD, random.Random(rng.random())))
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    threads = [threading.Thread(target=vu.run, args=(deadline,)) for vu in virtual_users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results = summarize(stats, time.perf_counter() - started)
+    results['parameters'] = vars(args)
+
+    print(f"{'маршрут':22} {'запросов':>9} {'ошибок':>7} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'SQL/запрос':>10}")
+    for name, route in results['routes'].items():
+        queries = f"{route['queries_per_request']:.1f}" if route['queries_per_request'] is not None else '-'
+        print(f"{name:22} {route['requests']:9} {route['errors']:7} {route['p50_ms']:8.1f} "
+              f"{route['p95_ms']:8.1f} {route['p99_ms']:8.1f} {queries:>10}")
+    print(f"Всего {results['requests']} запросов, {results['throughput']:.1f} запросов/с")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print('Регрессия:', line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Замер холодного старта: импорт app.py, create_app() и первый запрос к главной странице.
+
+Каждый замер выполняется в новом процессе интерпретатора:
+
+    python benchmarks/startup.py --runs 10 --output startup.json
+    python benchmarks/startup.py --baseline startup.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import json, time
+t0 = time.perf_counter()
+import app as module
+t1 = time.perf_counter()
+application = module.create_app()
+t2 = time.perf_counter()
+application.test_client().get('/')
+t3 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'create_app': t2 - t1, 'first_request': t3 - t2, 'total': t3 - t0}))
+'''
+
+
+def measure(runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        phase: {
+            'median': statistics.median(s[phase] for s in samples),
+            'min': min(s[phase] for s in samples),
+            'max': max(s[phase] for s in samples),
+        }
+        for phase in samples[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер времени холодного старта приложения')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help='сохранить результат в JSON')
+    parser.add_argument('--baseline', help='JSON предыдущего прогона для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='допустимый рост медианы (доля)')
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+    for phase, values in results.items():
+        print(f"{phase:14} median {values['median'] * 1000:8.1f} ms   "
+              f"min {values['min'] * 1000:8.1f} ms   max {values['max'] * 1000:8.1f} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        current = results['total']['median']
+        previous = baseline['total']['median']
+        print(f'total: {previous * 1000:.1f} ms -> {current * 1000:.1f} ms')
+        if current > previous * (1 + args.tolerance):
+            print('Регрессия времени старта')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from sqlalchemy.exc import IntegrityError
+
+from config import db, CacheVersion
+
+
+# Локальное хранилище в памяти процесса. Записи старых версий каталога никто не читает,
+# поэтому истёкшие записи вычищаются при каждой записи, а размер ограничен max_entries
+class LocalCacheBackend:
+    def __init__(self, max_entries=100):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            now = time.monotonic()
+            for stale in [k for k, (_, e) in self._data.items() if e is not None and e < now]:
+                del self._data[stale]
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Общее хранилище для нескольких воркеров (нужен пакет redis)
+class RedisCacheBackend:
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, timeout=None):
+        self._client.set(key, json.dumps(value), ex=timeout)
+
+    def clear(self):
+        for key in self._client.scan_iter('catalog:*'):
+            self._client.delete(key)
+
+
+class CatalogCache:
+    def __init__(self, backend=None, timeout=300):
+        self.backend = backend or LocalCacheBackend()
+        self.timeout = timeout
+
+    def init_app(self, app):
+        url = app.config.get('CATALOG_CACHE_URL')
+        if url:
+            self.backend = RedisCacheBackend(url)
+        self.timeout = app.config.get('CATALOG_CACHE_TIMEOUT', self.timeout)
+
+    def state(self):
+        # Версия каталога и время последней правки хранятся в базе: их видят все воркеры,
+        # и после перезапуска старый ETag не совпадёт с изменённым каталогом
+        row = db.session.get(CacheVersion, 'catalog')
+        if row is None:
+            return 0, None
+        return row.version, row.updated_at.replace(tzinfo=timezone.utc, microsecond=0)
+
+    def get_or_set(self, name, factory, version=None):
+        if version is None:
+            version = self.state()[0]
+        key = f'catalog:{version}:{name}'
+        value = self.backend.get(key)
+        if value is None:
+            value = factory()
+            self.backend.set(key, value, self.timeout)
+        return value
+
+    def invalidate(self):
+        # Записи старых версий больше не читаются и истекают сами
+        now = datetime.utcnow()
+        values = {CacheVersion.version: CacheVersion.version + 1, CacheVersion.updated_at: now}
+        if not CacheVersion.query.filter_by(name='catalog').update(values):
+            try:
+                db.session.add(CacheVersion(name='catalog', version=1, updated_at=now))
+                db.session.commit()
+                return
+            except IntegrityError:
+                # Строку одновременно создал другой воркер
+                db.session.rollback()
+                CacheVersion.query.filter_by(name='catalog').update(values)
+        db.session.commit()
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,140 @@
+from datetime import date
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from config import db, User, WorkType, Mechanic
+from search import create_search_tables
+from analytics import rebuild_rollups
+from assets import assets
+from jobs import create_purge_jobs, job_runner
+from archive import order_archive
+from database import sync_sqlite_replicas
+
+
+def init_db():
+    # Создание всех таблиц в базе данных
+    db.create_all()
+    create_search_tables(db)
+
+
+def seed_db():
+    messages = []
+
+    # Создание первого администратора, если его еще нет
+    if not User.query.filter_by(role='admin').first():
+        admin = User(
+            username='admin',
+            date_of_birth=date(1990, 1, 1),
+            gender='male',
+            role='admin',
+            phone='1234567890',
+            email='admin@example.com'
+        )
+        admin.set_password('admin123')
+        db.session.add(admin)
+        messages.append("Первый администратор создан: username=admin, password=admin123")
+
+    # Добавление видов работ, если их еще нет
+    if not WorkType.query.first():
+        db.session.add_all([
+            WorkType(name="Ремонт двигателя",
+                     description="Полный ремонт двигателя автомобиля, включая замену деталей и диагностику."),
+            WorkType(name="Покраска кузова",
+                     description="Качественная покраска кузова автомобиля с использованием современных материалов."),
+            WorkType(name="Замена шин", description="Сезонная замена шин, балансировка и проверка давления."),
+            WorkType(name="Диагностика электроники", description="Проверка и ремонт электронных систем автомобиля.")
+        ])
+        messages.append("Виды работ добавлены в базу данных")
+
+    # Добавление исполнителей, если их еще нет
+    if not Mechanic.query.first():
+        db.session.add_all([
+            Mechanic(name="Иван Иванов", phone="1234567890", specialization="Ремонт двигателей"),
+            Mechanic(name="Петр Петров", phone="0987654321", specialization="Покраска кузова"),
+            Mechanic(name="Алексей Сидоров", phone="1112223334", specialization="Диагностика электроники")
+        ])
+        messages.append("Исполнители добавлены в базу данных")
+
+    # Все начальные данные записываются одним коммитом
+    db.session.commit()
+    return messages
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Создать таблицы и поисковые индексы (повторный запуск ничего не меняет)."""
+    init_db()
+    click.echo('База данных инициализирована')
+
+
+@click.command('seed')
+@with_appcontext
+def seed_command():
+    """Заполнить базу начальными данными, если их еще нет."""
+    messages = seed_db()
+    for message in messages:
+        click.echo(message)
+    if not messages:
+        click.echo('Начальные данные уже есть в базе')
+
+
+@click.command('rebuild-rollups')
+@with_appcontext
+def rebuild_rollups_command():
+    """Пересчитать дневные счётчики аналитики по таблицам заказов и пользователей."""
+    rebuild_rollups()
+    click.echo('Счётчики аналитики пересчитаны')
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Собрать статику: имена с хэшем, gzip/brotli-копии, WebP/AVIF-варианты картинок."""
+    manifest = assets.build(current_app)
+    click.echo(f"Собрано файлов: {len(manifest['files'])}, адаптивных картинок: {len(manifest['images'])}")
+
+
+@click.command('purge-deleted')
+@with_appcontext
+def purge_deleted_command():
+    """Удалить заказы и записи, помеченные на удаление, если фоновая задача не завершилась."""
+    jobs = create_purge_jobs()
+    for job in jobs:
+        job_runner.run(job.id)
+        click.echo(f'Задача #{job.id} ({job.kind}): {job.status}')
+    if not jobs:
+        click.echo('Нет записей, ожидающих удаления')
+
+
+@click.command('archive-orders')
+@with_appcontext
+def archive_orders_command():
+    """Перенести в архив оплаченные заказы старше ORDER_ARCHIVE_AFTER_DAYS дней (запускать по cron)."""
+    job = job_runner.create('archive_orders', before=order_archive.horizon().isoformat())
+    job_runner.run(job.id)
+    db.session.refresh(job)
+    if job.status == 'done':
+        click.echo(f'Перенесено в архив заказов: {job.done}')
+    else:
+        click.echo(f'Задача #{job.id} завершилась ошибкой: {job.message}')
+
+
+@click.command('sync-replicas')
+@with_appcontext
+def sync_replicas_command():
+    """Скопировать основную SQLite-базу в файлы реплик (локальная замена репликации)."""
+    synced = sync_sqlite_replicas(db)
+    click.echo(f"Реплики обновлены: {', '.join(synced)}" if synced else 'SQLite-реплики не настроены')
+
+
+def register_commands(app):
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(rebuild_rollups_command)
+    app.cli.add_command(build_assets_command)
+    app.cli.add_command(purge_deleted_command)
+    app.cli.add_command(sync_replicas_command)
+    app.cli.add_command(archive_orders_command)
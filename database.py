@@ -0,0 +1,234 @@
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+from functools import wraps
+
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+REPLICA_PREFIX = 'replica_'
+ARCHIVE_BIND = 'archive'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Профили работы с SQLite: PRAGMA выполняются на каждом новом соединении пула
+DATABASE_PROFILES = {
+    'default': {
+        'pragmas': {},
+        'engine_options': {},
+    },
+    'production': {
+        'pragmas': {
+            'journal_mode': 'WAL',  # читатели не ждут писателя
+            'synchronous': 'NORMAL',  # в режиме WAL безопасно и без fsync на каждый коммит
+            'cache_size': -64000,  # 64 МБ страничного кэша
+            'mmap_size': 268435456,  # 256 МБ отображения файла в память
+            'busy_timeout': 5000,  # ждать блокировку до 5 секунд вместо database is locked
+            'temp_store': 'MEMORY',
+        },
+        'engine_options': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 10,
+            'pool_pre_ping': True,
+        },
+    },
+}
+
+
+def configure_database(app, profile):
+    settings = DATABASE_PROFILES[profile]
+    app.config['DATABASE_PROFILE'] = profile
+    app.config['SQLITE_PRAGMAS'] = dict(settings['pragmas'])
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(settings['engine_options'])
+    # Каждая реплика — отдельный движок Flask-SQLAlchemy (bind) с теми же настройками пула
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for i, url in enumerate(app.config.get('SQLALCHEMY_REPLICA_URIS') or []):
+        binds[f'{REPLICA_PREFIX}{i}'] = url
+    # Архив заказов — свой движок всегда, даже если это та же база, что и основная
+    binds[ARCHIVE_BIND] = app.config.get('ORDER_ARCHIVE_URI') or app.config['SQLALCHEMY_DATABASE_URI']
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def install_sqlite_pragmas(app, engine):
+    # Вызывается сразу после создания движка, до первого соединения
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas or engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+# Сессия, которая отправляет SELECT из помеченных представлений на реплику.
+# Всё остальное (INSERT/UPDATE/DELETE, flush, text-запросы) идёт в основную базу,
+# а запросы к моделям с другим bind (архив заказов) — в их собственную базу.
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is None and not self._flushing and isinstance(clause, Select) and engine is self._db.engine:
+            return replica_router.read_engine(self._db) or engine
+        return engine
+
+
+# Чтение с реплик: представление помечается декоратором read_replica.
+# После записи пользователь REPLICA_STICKY_SECONDS читает из основной базы,
+# чтобы сразу видеть свои изменения, даже если реплика ещё отстаёт.
+class ReplicaRouter:
+    def __init__(self):
+        self.keys = []
+        self.sticky_seconds = 10
+
+    def init_app(self, app, db):
+        self.keys = [key for key in app.config['SQLALCHEMY_BINDS'] if key.startswith(REPLICA_PREFIX)]
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', self.sticky_seconds)
+        if not event.contains(RoutingSession, 'after_flush', _mark_write):
+            event.listen(RoutingSession, 'after_flush', _mark_write)
+        app.after_request(self._remember_write)
+
+    def engines(self, db):
+        return [db.engines[key] for key in self.keys]
+
+    def use_replica(self):
+        if self.keys and session.get('db_primary_until', 0) < time.time():
+            g.db_read_replica = True
+
+    def read_engine(self, db):
+        if not self.keys or not has_request_context():
+            return None
+        if not g.get('db_read_replica') or g.get('db_wrote'):
+            return None
+        return db.engines[random.choice(self.keys)]
+
+    def _remember_write(self, response):
+        # Запись может идти и через поток-писатель, поэтому учитываем и сам метод запроса
+        if self.keys and (g.get('db_wrote') or request.method not in SAFE_METHODS):
+            session['db_primary_until'] = time.time() + self.sticky_seconds
+        return response
+
+
+def _mark_write(db_session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+def read_replica(view):
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        replica_router.use_replica()
+        return view(*args, **kwargs)
+    return decorated
+
+
+def sync_sqlite_replicas(db):
+    # Для локальной проверки: копия основной SQLite-базы в файлы реплик через backup API
+    synced = []
+    for key, engine in zip(replica_router.keys, replica_router.engines(db)):
+        if db.engine.dialect.name != 'sqlite' or engine.dialect.name != 'sqlite':
+            continue
+        source, target = db.engine.raw_connection(), engine.raw_connection()
+        try:
+            source.driver_connection.backup(target.driver_connection)
+        finally:
+            target.close()
+            source.close()
+        synced.append(key)
+    return synced
+
+
+replica_router = ReplicaRouter()
+
+
+class _WriteJob:
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+# Единственный поток-писатель: собирает записи из запросов и фиксирует их пачкой одним коммитом
+class WriteQueue:
+    def __init__(self, app=None, db=None):
+        self.app = app
+        self.db = db
+        self.enabled = False
+        self.max_batch = 50
+        self.linger = 0.002
+        self.timeout = 30
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+        self.enabled = app.config.get('DB_WRITE_QUEUE', False)
+        self.max_batch = app.config.get('DB_WRITE_QUEUE_BATCH', self.max_batch)
+        self.linger = app.config.get('DB_WRITE_QUEUE_LINGER', self.linger)
+
+    def run(self, fn, *args, **kwargs):
+        # fn получает данные только через аргументы и возвращает простые значения (id, счётчики)
+        if not self.enabled:
+            try:
+                result = fn(*args, **kwargs)
+                self.db.session.commit()
+            except Exception:
+                self.db.session.rollback()
+                raise
+            return result
+        self._start()
+        job = _WriteJob(fn, args, kwargs)
+        self._queue.put(job)
+        return job.future.result(self.timeout)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name='db-writer', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get(timeout=self.linger))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        with self.app.app_context():
+            while True:
+                batch = self._collect()
+                try:
+                    results = [job.fn(*job.args, **job.kwargs) for job in batch]
+                    self.db.session.commit()
+                except Exception:
+                    # Одна запись сломала пачку: откатываемся и проводим записи по одной
+                    self.db.session.rollback()
+                    for job in batch:
+                        self._run_single(job)
+                else:
+                    for job, result in zip(batch, results):
+                        job.future.set_result(result)
+
+    def _run_single(self, job):
+        try:
+            result = job.fn(*job.args, **job.kwargs)
+            self.db.session.commit()
+        except Exception as e:
+            self.db.session.rollback()
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+
+
+write_queue = WriteQueue()
@@ -0,0 +1,164 @@
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+# Подписка одного браузера: ограниченная очередь, при переполнении клиент получает resync
+class Subscription:
+    def __init__(self, bus, channels, size):
+        self.bus = bus
+        self.channels = set(channels)
+        self.queue = queue.Queue(maxsize=size)
+        self.overflowed = False
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Медленный клиент не тормозит публикацию: пропущенное он заберёт перезагрузкой
+            self.overflowed = True
+
+    def get(self, timeout):
+        if self.overflowed:
+            self.overflowed = False
+            return {'id': None, 'type': 'resync', 'data': {}}
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+# Шина событий процесса. С EVENTS_BROKER_URL (redis://...) события других воркеров
+# приходят через Redis pub/sub и раздаются подписчикам этого процесса.
+class EventBus:
+    def __init__(self):
+        self.queue_size = 100
+        self.max_subscribers = 1000
+        self.history = deque(maxlen=1000)
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._redis = None
+        self._listener = None
+        self.logger = None
+        self.channel_prefix = 'praktika:events:'
+        self.streaming = None
+
+    def init_app(self, app):
+        self.logger = app.logger
+        self.queue_size = app.config.get('EVENTS_QUEUE_SIZE', self.queue_size)
+        self.max_subscribers = app.config.get('EVENTS_MAX_SUBSCRIBERS', self.max_subscribers)
+        self.history = deque(maxlen=app.config.get('EVENTS_HISTORY', 1000))
+        self.streaming = app.config.get('EVENTS_STREAMING')
+        if self.streaming == 'gevent':
+            # Без monkey patching каждый открытый поток занимал бы целый воркер
+            from gevent import monkey
+            if not monkey.is_module_patched('socket'):
+                raise RuntimeError('EVENTS_STREAMING=gevent: запустите приложение под gevent (gunicorn -k gevent)')
+        elif self.streaming:
+            raise RuntimeError(f'Неизвестный EVENTS_STREAMING: {self.streaming}')
+        url = app.config.get('EVENTS_BROKER_URL')
+        if url:
+            import redis
+            self._redis = redis.Redis.from_url(url)
+        else:
+            self._redis = None
+
+    def publish(self, channel, event_type, data):
+        if self._redis is not None:
+            self._start_listener()
+            # Номер события общий для всех воркеров: его выдаёт Redis, и он едет вместе с событием,
+            # иначе Last-Event-ID после переподключения к другому воркеру указывал бы не туда
+            try:
+                event_id = self._redis.incr(self.channel_prefix + 'last-id')
+                self._redis.publish(self.channel_prefix + channel,
+                                    json.dumps({'id': event_id, 'type': event_type, 'data': data}, default=str))
+            except Exception:
+                # События публикуются после коммита и лишь подсказывают браузерам обновиться:
+                # без брокера запрос всё равно завершается успешно, а событие теряется
+                if self.logger is not None:
+                    self.logger.exception('Не удалось опубликовать событие %s в %s', event_type, channel)
+        else:
+            self._dispatch(channel, event_type, data)
+
+    def _dispatch(self, channel, event_type, data, event_id=None):
+        with self._lock:
+            if event_id is None:
+                event_id = next(self._ids)
+            event = {'id': event_id, 'channel': channel, 'type': event_type, 'data': data}
+            self.history.append(event)
+            subscribers = [s for s in self._subscribers if channel in s.channels]
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name='events-broker', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.channel_prefix + '*')
+                for message in pubsub.listen():
+                    channel = message['channel'].decode()[len(self.channel_prefix):]
+                    payload = json.loads(message['data'])
+                    self._dispatch(channel, payload['type'], payload['data'], payload['id'])
+            except Exception:
+                # Брокер недоступен: переподключаемся, подписчики просто не получают события
+                time.sleep(1)
+
+    def subscribe(self, channels, last_event_id=None):
+        if self._redis is not None:
+            self._start_listener()
+        subscription = Subscription(self, channels, self.queue_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers()
+            self._subscribers.add(subscription)
+            missed = self._missed(subscription, last_event_id)
+        for event in missed:
+            subscription.deliver(event)
+        return subscription
+
+    def _missed(self, subscription, last_event_id):
+        # Переподключение с Last-Event-ID: досылаем пропущенное из недавней истории
+        if last_event_id is None:
+            return []
+        if not self.history or last_event_id < self.history[0]['id'] - 1 or last_event_id > self.history[-1]['id']:
+            subscription.overflowed = True
+            return []
+        return [e for e in self.history if e['id'] > last_event_id and e['channel'] in subscription.channels]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+def format_sse(event):
+    lines = []
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event['data'], ensure_ascii=False, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+events = EventBus()
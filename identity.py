@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+from config import db, User
+
+
+# Лёгкий объект текущего пользователя: только то, что нужно для проверки входа и прав.
+# Полную запись User страницы, которым она нужна (профиль), загружают сами.
+class Principal:
+    __slots__ = ('id', 'username', 'role')
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, id, username, role):
+        self.id = id
+        self.username = username
+        self.role = role
+
+    def get_id(self):
+        return str(self.id)
+
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def __eq__(self, other):
+        return isinstance(other, (Principal, User)) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+# LRU-кэш пользователей для user_loader с коротким временем жизни.
+# Кэш живёт в памяти процесса: invalidate() действует только в своём воркере, в остальных
+# изменения видны не позже чем через ttl секунд. Поэтому администраторы в кэш не попадают:
+# понижение или удаление администратора сразу действует во всех воркерах.
+class IdentityCache:
+    def __init__(self, ttl=5, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_CACHE_TTL', self.ttl)
+        self.max_size = app.config.get('USER_CACHE_SIZE', self.max_size)
+        self.clear()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+        row = db.session.query(User.id, User.username, User.role) \
+            .filter(User.id == user_id, User.deleted_at.is_(None)).first()
+        if row is None:
+            return None
+        principal = Principal(row.id, row.username, row.role)
+        if principal.is_admin():
+            return principal
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, principal)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,258 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, func, or_, select, update
+
+from config import db, User, WorkType, Order, ArchivedOrder, Job
+from analytics import record_orders_deleted, record_user_deleted
+from archive import order_archive
+from cache import catalog_cache
+from events import events
+from identity import identity_cache
+from scheduling import scheduler
+from transfer import IMPORTERS, read_rows
+
+
+# Доступ обработчика к своей задаче: параметры, прогресс и пауза между порциями
+class JobContext:
+    def __init__(self, runner, job):
+        self.runner = runner
+        self.job = job
+        self.params = json.loads(job.params)
+
+    def progress(self, done, total=None):
+        # Каждая порция — отдельная транзакция: запись в базу не блокируется на всё время задачи
+        self.job.done = done
+        if total is not None:
+            self.job.total = total
+        self.job.updated_at = datetime.utcnow()
+        db.session.commit()
+
+    def pause(self):
+        # Даём запросам пользователей занять блокировку записи между порциями
+        time.sleep(self.runner.pause)
+
+
+# Очередь задач хранится в таблице job, выполняют её потоки процесса.
+# Задача запускается только после захвата строки (queued -> running), поэтому
+# при перезапуске или нескольких воркерах одна задача не выполняется дважды.
+class JobRunner:
+    def __init__(self):
+        self.app = None
+        self.workers = 1
+        self.chunk_size = 500
+        self.pause = 0.05
+        self.stale_after = timedelta(seconds=300)
+        self.handlers = {}
+        self._executor = None
+        self._recovered = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('JOB_WORKERS', self.workers)
+        self.chunk_size = app.config.get('JOB_CHUNK_SIZE', self.chunk_size)
+        self.pause = app.config.get('JOB_CHUNK_PAUSE', self.pause)
+        self.stale_after = timedelta(seconds=app.config.get('JOB_STALE_AFTER', 300))
+        self._recovered = False
+
+    def handler(self, kind):
+        def decorator(fn):
+            self.handlers[kind] = fn
+            return fn
+        return decorator
+
+    def create(self, kind, created_by=None, **params):
+        job = Job(kind=kind, params=json.dumps(params), created_by=created_by)
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    def enqueue(self, kind, created_by=None, **params):
+        self.recover()
+        job = self.create(kind, created_by, **params)
+        self.submit(job.id)
+        return job
+
+    def submit(self, job_id):
+        if not self.workers:
+            self.run(job_id)
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        self._executor.submit(self._run_in_app, job_id)
+
+    def _run_in_app(self, job_id):
+        with self.app.app_context():
+            self.run(job_id)
+
+    def _stale_condition(self, now):
+        return or_(Job.status == 'queued',
+                   and_(Job.status == 'running', Job.updated_at < now - self.stale_after))
+
+    def _claim(self, job_id):
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            update(Job).where(Job.id == job_id, self._stale_condition(now))
+            .values(status='running', updated_at=now)).rowcount
+        db.session.commit()
+        return claimed == 1
+
+    def run(self, job_id):
+        if not self._claim(job_id):
+            return
+        job = db.session.get(Job, job_id)
+        try:
+            result = self.handlers[job.kind](JobContext(self, job))
+        except Exception as e:
+            db.session.rollback()
+            self.app.logger.exception('Задача %d (%s) завершилась ошибкой', job_id, job.kind)
+            job.status = 'failed'
+            job.message = str(e)
+        else:
+            job.status = 'done'
+            job.result = json.dumps(result, ensure_ascii=False) if result is not None else None
+        job.finished_at = job.updated_at = datetime.utcnow()
+        db.session.commit()
+
+    def retry(self, job):
+        job.status = 'queued'
+        job.message = None
+        job.updated_at = datetime.utcnow()
+        db.session.commit()
+        self.submit(job.id)
+
+    def recover(self):
+        # Один раз на процесс подхватываем задачи, брошенные упавшим или перезапущенным воркером
+        with self._lock:
+            if self._recovered:
+                return
+            self._recovered = True
+        job_ids = db.session.scalars(select(Job.id).where(self._stale_condition(datetime.utcnow()))).all()
+        for job_id in job_ids:
+            self.submit(job_id)
+
+
+job_runner = JobRunner()
+
+
+def _purge_orders(ctx, column, value):
+    condition = getattr(Order, column) == value
+    archived = getattr(ArchivedOrder, column) == value
+    total = db.session.query(func.count(Order.id)).filter(condition).scalar() \
+        + db.session.query(func.count(ArchivedOrder.id)).filter(archived).scalar()
+    ctx.progress(0, total)
+    done = 0
+    mechanic_ids = set()
+    while True:
+        chunk = select(Order.id).where(condition).limit(ctx.runner.chunk_size)
+        rows = db.session.execute(
+            delete(Order).where(Order.id.in_(chunk))
+            .returning(Order.mechanic_id, Order.created_at, Order.work_type_id, Order.is_paid)).all()
+        if not rows:
+            break
+        # Сводка аналитики уменьшается в той же транзакции, что и удаление
+        record_orders_deleted([(row.created_at, row.work_type_id, row.is_paid) for row in rows])
+        done += len(rows)
+        mechanic_ids.update(row.mechanic_id for row in rows if row.mechanic_id)
+        ctx.progress(done)
+        ctx.pause()
+    # Архив может быть отдельной базой: удаляем из него своими транзакциями
+    db.session.commit()
+    while True:
+        chunk = select(ArchivedOrder.id).where(archived).limit(ctx.runner.chunk_size)
+        rows = db.session.execute(
+            delete(ArchivedOrder).where(ArchivedOrder.id.in_(chunk))
+            .returning(ArchivedOrder.created_at, ArchivedOrder.work_type_id)).all()
+        # Архивные заказы всегда оплачены
+        record_orders_deleted([(row.created_at, row.work_type_id, True) for row in rows])
+        db.session.commit()
+        if not rows:
+            break
+        done += len(rows)
+        ctx.progress(done)
+        ctx.pause()
+    # Освободившиеся слоты перечитаются из базы при следующем бронировании
+    for mechanic_id in mechanic_ids:
+        scheduler.forget(mechanic_id)
+    return done
+
+
+@job_runner.handler('purge_user')
+def purge_user(ctx):
+    user_id = ctx.params['user_id']
+    orders = _purge_orders(ctx, 'user_id', user_id)
+    created_at = db.session.execute(
+        delete(User).where(User.id == user_id, User.deleted_at.is_not(None)).returning(User.created_at)).scalar()
+    record_user_deleted(created_at)
+    db.session.commit()
+    identity_cache.invalidate(user_id)
+    events.publish('admin', 'user.changed', {'id': user_id})
+    return {'orders': orders}
+
+
+@job_runner.handler('purge_work_type')
+def purge_work_type(ctx):
+    work_type_id = ctx.params['work_type_id']
+    orders = _purge_orders(ctx, 'work_type_id', work_type_id)
+    db.session.execute(delete(WorkType).where(WorkType.id == work_type_id, WorkType.deleted_at.is_not(None)))
+    db.session.commit()
+    return {'orders': orders}
+
+
+@job_runner.handler('import')
+def import_file(ctx):
+    entity, path, fmt = ctx.params['entity'], ctx.params['path'], ctx.params['format']
+
+    def progress(result):
+        ctx.progress(result.created + result.error_count)
+        ctx.pause()
+
+    try:
+        with open(path, 'rb') as f:
+            result = IMPORTERS[entity](read_rows(f, fmt), ctx.runner.app.config['IMPORT_BATCH_SIZE'], progress)
+    finally:
+        os.remove(path)
+    if entity == 'mechanics' and result.created:
+        catalog_cache.invalidate()
+        events.publish('catalog', 'catalog.changed', {'kind': 'mechanic', 'id': None})
+    ctx.progress(result.created + result.error_count, result.created + result.error_count)
+    return {'created': result.created, 'error_count': result.error_count, 'errors': result.errors}
+
+
+@job_runner.handler('archive_orders')
+def archive_orders(ctx):
+    before = datetime.fromisoformat(ctx.params['before'])
+    order_archive.create_table()
+    order_archive.reserve_ids()
+    condition = order_archive.archivable(before, datetime.utcnow())
+    ctx.progress(0, order_archive.count(condition))
+    done = 0
+    while True:
+        moved = order_archive.move(condition, ctx.runner.chunk_size)
+        if not moved:
+            break
+        done += moved
+        ctx.progress(done)
+        ctx.pause()
+    return {'archived': done, 'before': before.isoformat()}
+
+
+def create_purge_jobs(created_by=None):
+    # Помеченные на удаление записи без активной задачи (например, после сбоя)
+    active = {(job.kind, job.params) for job in Job.query.filter(Job.status.in_(['queued', 'running']))}
+    jobs = []
+    for user_id in db.session.scalars(select(User.id).where(User.deleted_at.is_not(None))).all():
+        params = json.dumps({'user_id': user_id})
+        if ('purge_user', params) not in active:
+            jobs.append(job_runner.create('purge_user', created_by, user_id=user_id))
+    for work_type_id in db.session.scalars(select(WorkType.id).where(WorkType.deleted_at.is_not(None))).all():
+        params = json.dumps({'work_type_id': work_type_id})
+        if ('purge_work_type', params) not in active:
+            jobs.append(job_runner.create('purge_work_type', created_by, work_type_id=work_type_id))
+    return jobs
@@ -0,0 +1,196 @@
+import hmac
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, abort, before_render_template, g, has_request_context, request, template_rendered
+from flask_login import current_user
+from sqlalchemy import event
+
+# Границы корзин гистограммы времени ответа, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+def _labels(**labels):
+    # Счётчики свои у каждого процесса: метка worker не даёт склеить ряды разных воркеров в один
+    labels = dict(worker=os.getpid(), **labels)
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+# Время ответа по маршрутам, число и время SQL-запросов, время рендеринга шаблонов
+class Metrics:
+    def __init__(self):
+        self.query_budget = 20
+        self.server_timing = False
+        self.logger = None
+        self.token = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.requests = defaultdict(int)
+        self.sql_queries = defaultdict(int)
+        self.sql_seconds = defaultdict(float)
+        self.template_seconds = defaultdict(float)
+        self.template_renders = defaultdict(int)
+        self.budget_exceeded = defaultdict(int)
+
+    def init_app(self, app, *engines):
+        self.query_budget = app.config.get('METRICS_QUERY_BUDGET', self.query_budget)
+        self.server_timing = app.config.get('METRICS_SERVER_TIMING', self.server_timing)
+        self.logger = app.logger
+        self.token = app.config.get('METRICS_TOKEN')
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        for engine in engines:
+            self.instrument_engine(engine)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def instrument_engine(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    # SQL: учитываем только запросы, выполненные внутри HTTP-запроса
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        if has_request_context() and 'metrics_start' in g:
+            g.sql_queries += 1
+            g.sql_seconds += elapsed
+
+    def _handle_error(self, context):
+        # Упавший запрос не доходит до after_cursor_execute: снимаем его отметку здесь,
+        # иначе список в conn.info растёт вместе с пулом соединений
+        conn = context.connection
+        execution = context.execution_context
+        if conn is not None and execution is not None and conn.info.get('query_start'):
+            self._after_cursor_execute(conn, execution.cursor, context.statement, context.parameters,
+                                       execution, execution.executemany)
+
+    def _before_render(self, sender, template, context, **extra):
+        if 'metrics_start' in g:
+            g.render_stack.append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        if 'metrics_start' in g and g.render_stack:
+            elapsed = time.perf_counter() - g.render_stack.pop()
+            g.render_seconds += elapsed
+            with self._lock:
+                self.template_seconds[template.name] += elapsed
+                self.template_renders[template.name] += 1
+
+    def _start_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_recorded = False
+        g.sql_queries = 0
+        g.sql_seconds = 0.0
+        g.render_seconds = 0.0
+        g.render_stack = []
+
+    def _record(self, status):
+        if 'metrics_start' not in g or g.metrics_recorded:
+            return None
+        g.metrics_recorded = True
+        elapsed = time.perf_counter() - g.metrics_start
+        endpoint = request.endpoint or 'unknown'
+        with self._lock:
+            self.latency[endpoint].observe(elapsed)
+            self.requests[(endpoint, request.method, status)] += 1
+            self.sql_queries[endpoint] += g.sql_queries
+            self.sql_seconds[endpoint] += g.sql_seconds
+            if g.sql_queries > self.query_budget:
+                self.budget_exceeded[endpoint] += 1
+        if g.sql_queries > self.query_budget:
+            # Так находятся N+1: страница делает запрос на каждую строку
+            self.logger.warning('%s %s: %d SQL-запросов (бюджет %d), %.1f мс SQL',
+                                request.method, request.path, g.sql_queries, self.query_budget,
+                                g.sql_seconds * 1000)
+        return elapsed
+
+    def _finish_request(self, response):
+        elapsed = self._record(response.status_code)
+        if elapsed is not None and self.server_timing:
+            response.headers.add('Server-Timing', f'db;dur={g.sql_seconds * 1000:.2f};desc="{g.sql_queries} queries"')
+            response.headers.add('Server-Timing', f'render;dur={g.render_seconds * 1000:.2f}')
+            response.headers.add('Server-Timing', f'total;dur={elapsed * 1000:.2f}')
+        return response
+
+    def _teardown_request(self, exc):
+        if exc is not None:
+            self._record(500)
+
+    def render(self):
+        lines = [
+            '# HELP praktika_request_duration_seconds Время обработки запроса',
+            '# TYPE praktika_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            for endpoint, histogram in sorted(self.latency.items()):
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'praktika_request_duration_seconds_bucket{{{_labels(endpoint=endpoint, le=bound)}}} {count}')
+                lines.append(f'praktika_request_duration_seconds_bucket{{{_labels(endpoint=endpoint, le="+Inf")}}} {histogram.total}')
+                lines.append(f'praktika_request_duration_seconds_sum{{{_labels(endpoint=endpoint)}}} {histogram.sum}')
+                lines.append(f'praktika_request_duration_seconds_count{{{_labels(endpoint=endpoint)}}} {histogram.total}')
+
+            lines += ['# HELP praktika_requests_total Число запросов',
+                      '# TYPE praktika_requests_total counter']
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'praktika_requests_total{{{_labels(endpoint=endpoint, method=method, status=status)}}} {count}')
+
+            lines += ['# HELP praktika_sql_queries_total Число SQL-запросов',
+                      '# TYPE praktika_sql_queries_total counter']
+            for endpoint, count in sorted(self.sql_queries.items()):
+                lines.append(f'praktika_sql_queries_total{{{_labels(endpoint=endpoint)}}} {count}')
+
+            lines += ['# HELP praktika_sql_duration_seconds_total Суммарное время SQL-запросов',
+                      '# TYPE praktika_sql_duration_seconds_total counter']
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'praktika_sql_duration_seconds_total{{{_labels(endpoint=endpoint)}}} {seconds}')
+
+            lines += ['# HELP praktika_query_budget_exceeded_total Запросы, превысившие бюджет SQL-запросов',
+                      '# TYPE praktika_query_budget_exceeded_total counter']
+            for endpoint, count in sorted(self.budget_exceeded.items()):
+                lines.append(f'praktika_query_budget_exceeded_total{{{_labels(endpoint=endpoint)}}} {count}')
+
+            lines += ['# HELP praktika_template_render_seconds Время рендеринга шаблонов',
+                      '# TYPE praktika_template_render_seconds summary']
+            for name, seconds in sorted(self.template_seconds.items()):
+                lines.append(f'praktika_template_render_seconds_sum{{{_labels(template=name)}}} {seconds}')
+                lines.append(f'praktika_template_render_seconds_count{{{_labels(template=name)}}} {self.template_renders[name]}')
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        # Сборщику метрик нужен токен (Authorization: Bearer ...), в браузере страницу видят только администраторы
+        header = request.headers.get('Authorization', '')
+        if not (self.token and hmac.compare_digest(header, f'Bearer {self.token}')) and \
+                not (current_user.is_authenticated and current_user.is_admin()):
+            abort(403)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+metrics = Metrics()
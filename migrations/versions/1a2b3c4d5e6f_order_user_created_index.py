@@ -0,0 +1,26 @@
+"""Составной индекс order(user_id, created_at)
+
+Revision ID: 1a2b3c4d5e6f
+Revises: 
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1a2b3c4d5e6f'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Таблицы создаются через db.create_all(), поэтому индекс мог уже появиться
+    op.create_index('ix_order_user_id_created_at', 'order', ['user_id', 'created_at'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_order_user_id_created_at', table_name='order', if_exists=True)
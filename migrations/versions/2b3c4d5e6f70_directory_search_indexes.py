@@ -0,0 +1,31 @@
+"""Индексы для поиска в справочниках пользователей и исполнителей
+
+Revision ID: 2b3c4d5e6f70
+Revises: 1a2b3c4d5e6f
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b3c4d5e6f70'
+down_revision = '1a2b3c4d5e6f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_user_phone', 'user', ['phone'], unique=False, if_not_exists=True)
+    op.create_index('ix_mechanic_name', 'mechanic', ['name'], unique=False, if_not_exists=True)
+    op.create_index('ix_mechanic_phone', 'mechanic', ['phone'], unique=False, if_not_exists=True)
+    op.create_index('ix_mechanic_specialization', 'mechanic', ['specialization'], unique=False,
+                    if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_mechanic_specialization', table_name='mechanic', if_exists=True)
+    op.drop_index('ix_mechanic_phone', table_name='mechanic', if_exists=True)
+    op.drop_index('ix_mechanic_name', table_name='mechanic', if_exists=True)
+    op.drop_index('ix_user_phone', table_name='user', if_exists=True)
@@ -0,0 +1,47 @@
+"""Дневные счётчики для аналитики и дата регистрации пользователя
+
+Revision ID: 3c4d5e6f7081
+Revises: 2b3c4d5e6f70
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c4d5e6f7081'
+down_revision = '2b3c4d5e6f70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('user')}
+    if 'created_at' not in columns:
+        op.add_column('user', sa.Column('created_at', sa.DateTime(), nullable=True))
+    op.create_table(
+        'order_daily_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('work_type_id', sa.Integer(), nullable=False),
+        sa.Column('orders_count', sa.Integer(), nullable=False),
+        sa.Column('paid_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'work_type_id'),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'registration_daily_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('users_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day'),
+        if_not_exists=True,
+    )
+    # После обновления заполните счётчики по существующим заказам: flask rebuild-rollups
+
+
+def downgrade():
+    op.drop_table('registration_daily_stats', if_exists=True)
+    op.drop_table('order_daily_stats', if_exists=True)
+    # batch-режим пересоздаёт таблицу user вместе с триггерами поиска: после отката выполните flask init-db
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('created_at')
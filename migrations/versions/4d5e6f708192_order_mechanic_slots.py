@@ -0,0 +1,37 @@
+"""Исполнитель и время работ в заказе
+
+Revision ID: 4d5e6f708192
+Revises: 3c4d5e6f7081
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d5e6f708192'
+down_revision = '3c4d5e6f7081'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('order')}
+    # SQLite добавляет колонку с внешним ключом без пересоздания таблицы, ограничение описано в модели
+    if 'mechanic_id' not in columns:
+        op.add_column('order', sa.Column('mechanic_id', sa.Integer(), nullable=True))
+    if 'slot_start' not in columns:
+        op.add_column('order', sa.Column('slot_start', sa.DateTime(), nullable=True))
+    if 'slot_end' not in columns:
+        op.add_column('order', sa.Column('slot_end', sa.DateTime(), nullable=True))
+    op.create_index('ux_order_mechanic_id_slot_start', 'order', ['mechanic_id', 'slot_start'],
+                    unique=True, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ux_order_mechanic_id_slot_start', table_name='order', if_exists=True)
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_column('slot_end')
+        batch_op.drop_column('slot_start')
+        batch_op.drop_column('mechanic_id')
@@ -0,0 +1,50 @@
+"""Фоновые задачи и пометка об удалении пользователей и видов работ
+
+Revision ID: 5e6f708192a3
+Revises: 4d5e6f708192
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e6f708192a3'
+down_revision = '4d5e6f708192'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in ('user', 'work_type'):
+        if 'deleted_at' not in {c['name'] for c in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_table(
+        'job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('params', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=True),
+        sa.Column('done', sa.Integer(), nullable=False),
+        sa.Column('message', sa.Text(), nullable=True),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_job_status', 'job', ['status'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_job_status', table_name='job', if_exists=True)
+    op.drop_table('job', if_exists=True)
+    # batch-режим пересоздаёт таблицу user вместе с триггерами поиска: после отката выполните flask init-db
+    for table in ('work_type', 'user'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('deleted_at')
@@ -0,0 +1,32 @@
+"""Номер версии строки для ETag в JSON API
+
+Revision ID: 6f708192a3b4
+Revises: 5e6f708192a3
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f708192a3b4'
+down_revision = '5e6f708192a3'
+branch_labels = None
+depends_on = None
+
+TABLES = ('work_type', 'mechanic', 'order')
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        if 'version' not in {c['name'] for c in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    # batch-режим пересоздаёт таблицу mechanic вместе с триггерами поиска: после отката выполните flask init-db
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('version')
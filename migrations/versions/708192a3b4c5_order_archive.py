@@ -0,0 +1,47 @@
+"""Архив оплаченных заказов
+
+Revision ID: 708192a3b4c5
+Revises: 6f708192a3b4
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '708192a3b4c5'
+down_revision = '6f708192a3b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Архив в основной базе (ORDER_ARCHIVE_URL не задан); в отдельной базе таблицу создаёт flask init-db
+    op.create_table(
+        'order_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('work_type_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('is_paid', sa.Boolean(), nullable=False),
+        sa.Column('mechanic_id', sa.Integer(), nullable=True),
+        sa.Column('slot_start', sa.DateTime(), nullable=True),
+        sa.Column('slot_end', sa.DateTime(), nullable=True),
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_order_archive_user_id_created_at', 'order_archive', ['user_id', 'created_at'],
+                    if_not_exists=True)
+    op.create_index('ix_order_archive_work_type_id', 'order_archive', ['work_type_id'], if_not_exists=True)
+    op.create_index('ix_order_archive_mechanic_id', 'order_archive', ['mechanic_id'], if_not_exists=True)
+
+
+def downgrade():
+    # Заказы из архива в таблицу order не возвращаются и удаляются вместе с таблицей
+    op.drop_index('ix_order_archive_mechanic_id', table_name='order_archive', if_exists=True)
+    op.drop_index('ix_order_archive_work_type_id', table_name='order_archive', if_exists=True)
+    op.drop_index('ix_order_archive_user_id_created_at', table_name='order_archive', if_exists=True)
+    op.drop_table('order_archive', if_exists=True)
@@ -0,0 +1,39 @@
+"""id заказов без повторного использования (AUTOINCREMENT)
+
+Revision ID: 8192a3b4c5d6
+Revises: 708192a3b4c5
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8192a3b4c5d6'
+down_revision = '708192a3b4c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        # В PostgreSQL и других СУБД последовательность и так не выдаёт id повторно
+        return
+    with op.batch_alter_table('order', recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+        pass
+    # Счётчик начинается после максимального id и в основной таблице, и в архиве
+    top = bind.execute(sa.text(
+        "SELECT max(id) FROM (SELECT max(id) AS id FROM \"order\" UNION ALL SELECT max(id) FROM order_archive)")
+    ).scalar()
+    if top is not None:
+        bind.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = 'order'"))
+        bind.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('order', :top)"), {'top': top})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('order', recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+        pass
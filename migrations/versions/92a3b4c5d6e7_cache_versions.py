@@ -0,0 +1,31 @@
+"""Версия кэша каталога в базе
+
+Revision ID: 92a3b4c5d6e7
+Revises: 8192a3b4c5d6
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '92a3b4c5d6e7'
+down_revision = '8192a3b4c5d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'cache_version',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table('cache_version', if_exists=True)
@@ -0,0 +1,160 @@
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from config import db, Order, Mechanic
+
+
+def _stems(text):
+    # Грубое сравнение по основам: «Ремонт двигателя» совпадает с «Ремонт двигателей»
+    return {word[:5] for word in re.findall(r'\w+', (text or '').lower()) if len(word) >= 3}
+
+
+def matches_specialization(specialization, work_type_name):
+    wanted = _stems(work_type_name)
+    return bool(wanted) and wanted <= _stems(specialization)
+
+
+# Занятое время одного исполнителя: непересекающиеся блоки, соприкасающиеся брони склеены.
+# Промежутки между блоками — свободные окна, поэтому окно ищется бинарным поиском,
+# а не обходом броней: у полностью занятого исполнителя один блок на рабочий день.
+class MechanicSchedule:
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        self.bookings = 0
+        for start, end in sorted(intervals):
+            self.add(start, end)
+
+    def __len__(self):
+        return self.bookings
+
+    def next_free(self, start, duration):
+        # Блоки разделены окнами; пропускать приходится только окна короче duration,
+        # а при слотах одной длины на общей сетке таких не бывает
+        i = bisect_right(self.starts, start)
+        if i > 0 and self.ends[i - 1] > start:
+            start = self.ends[i - 1]
+        while i < len(self.starts) and self.starts[i] < start + duration:
+            start = max(start, self.ends[i])
+            i += 1
+        return start
+
+    def add(self, start, end):
+        # Блоки [i, j) пересекаются с новым интервалом или касаются его и сливаются в один
+        i = bisect_left(self.ends, start)
+        j = bisect_right(self.starts, end)
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+        self.bookings += 1
+
+    def remove(self, start, end):
+        i = bisect_right(self.starts, start) - 1
+        if i < 0 or self.ends[i] < end:
+            return
+        block_start, block_end = self.starts[i], self.ends[i]
+        pieces = [(s, e) for s, e in ((block_start, start), (end, block_end)) if s < e]
+        self.starts[i:i + 1] = [s for s, e in pieces]
+        self.ends[i:i + 1] = [e for s, e in pieces]
+        self.bookings -= 1
+
+
+# Подбор исполнителя и времени: специалист по виду работ с ближайшим свободным окном
+class Scheduler:
+    def __init__(self):
+        self.slot = timedelta(minutes=60)
+        self.day_start = 9
+        self.day_end = 18
+        self.horizon = timedelta(days=60)
+        self.any_mechanic = False
+        self._schedules = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.slot = timedelta(minutes=app.config.get('SLOT_MINUTES', 60))
+        self.day_start = app.config.get('WORKDAY_START_HOUR', self.day_start)
+        self.day_end = app.config.get('WORKDAY_END_HOUR', self.day_end)
+        self.horizon = timedelta(days=app.config.get('SCHEDULE_HORIZON_DAYS', 60))
+        self.any_mechanic = app.config.get('SCHEDULE_ANY_MECHANIC', self.any_mechanic)
+        self._schedules = {}
+
+    def _schedule(self, mechanic_id, now):
+        schedule = self._schedules.get(mechanic_id)
+        if schedule is None:
+            # Загружаем с диска один раз, дальше индекс обновляется при бронировании
+            rows = db.session.query(Order.slot_start, Order.slot_end) \
+                .filter(Order.mechanic_id == mechanic_id, Order.slot_end > now)
+            schedule = self._schedules[mechanic_id] = MechanicSchedule(rows)
+        return schedule
+
+    def _align(self, moment):
+        # Слоты идут сеткой от начала рабочего дня и только в рабочие часы
+        day = moment.replace(hour=self.day_start, minute=0, second=0, microsecond=0)
+        if moment <= day:
+            return day
+        steps = -(-(moment - day) // self.slot)
+        moment = day + steps * self.slot
+        if moment + self.slot > day.replace(hour=self.day_end):
+            return day + timedelta(days=1)
+        return moment
+
+    def _next_slot(self, schedule, earliest):
+        candidate = self._align(earliest)
+        limit = earliest + self.horizon
+        while candidate < limit:
+            free = schedule.next_free(candidate, self.slot)
+            aligned = self._align(free)
+            if aligned == free:
+                return free
+            candidate = aligned
+        return None
+
+    def mechanics(self):
+        # Один запрос на весь пакет бронирований
+        return db.session.query(Mechanic.id, Mechanic.name, Mechanic.specialization).all()
+
+    def candidates(self, work_type, mechanics):
+        specialists = [m for m in mechanics if matches_specialization(m.specialization, work_type.name)]
+        # Без специалиста заказ остаётся без назначения, если не разрешено брать любого исполнителя
+        if not specialists and self.any_mechanic:
+            return list(mechanics)
+        return specialists
+
+    def reserve(self, work_type, mechanics, earliest=None):
+        now = datetime.now()
+        earliest = max(earliest or now, now)
+        candidates = self.candidates(work_type, mechanics)
+        if not candidates:
+            return None
+        with self._lock:
+            best = None
+            for mechanic in candidates:
+                schedule = self._schedule(mechanic.id, now)
+                start = self._next_slot(schedule, earliest)
+                if start is not None and (best is None or (start, len(schedule)) < best[:2]):
+                    best = (start, len(schedule), mechanic)
+            if best is None:
+                return None
+            start, _, mechanic = best
+            # Резервируем сразу, чтобы параллельный запрос этого процесса не занял то же окно
+            self._schedules[mechanic.id].add(start, start + self.slot)
+        return {'mechanic_id': mechanic.id, 'mechanic_name': mechanic.name,
+                'slot_start': start, 'slot_end': start + self.slot}
+
+    def release(self, booking):
+        with self._lock:
+            schedule = self._schedules.get(booking['mechanic_id'])
+            if schedule is not None:
+                schedule.remove(booking['slot_start'], booking['slot_end'])
+
+    def forget(self, mechanic_id):
+        # Индекс исполнителя перечитается из базы при следующем бронировании
+        with self._lock:
+            self._schedules.pop(mechanic_id, None)
+
+
+scheduler = Scheduler()
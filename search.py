@@ -0,0 +1,75 @@
+from sqlalchemy import Integer, and_, column, or_, text
+
+# Поисковые FTS5-таблицы: имя -> (исходная таблица, индексируемые колонки)
+SEARCH_TABLES = {
+    'user_search': ('user', ('username', 'email', 'phone')),
+    'mechanic_search': ('mechanic', ('name', 'phone', 'specialization')),
+}
+
+# Trigram-токенизатор ищет по подстроке, но только от трёх символов
+MIN_FTS_QUERY_LENGTH = 3
+
+_fts_enabled = False
+
+
+def _schema(name, source, columns):
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{c}' for c in columns)
+    old_values = ', '.join(f'old.{c}' for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5("
+        f"{cols}, content='{source}', content_rowid='id', tokenize='trigram')",
+        f'CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON "{source}" BEGIN '
+        f'INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new_values}); END',
+        f'CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON "{source}" BEGIN '
+        f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END",
+        f'CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE ON "{source}" BEGIN '
+        f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+        f'INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new_values}); END',
+    ]
+
+
+def create_search_tables(db):
+    # Создаёт FTS5-таблицы и триггеры синхронизации; на других СУБД поиск идёт по обычным индексам
+    if db.engine.dialect.name != 'sqlite':
+        return
+    with db.engine.begin() as connection:
+        existing = {row[0] for row in connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+        for name, (source, columns) in SEARCH_TABLES.items():
+            for statement in _schema(name, source, columns):
+                connection.execute(text(statement))
+            if name not in existing:
+                # Таблица создана впервые: индексируем уже существующие строки
+                connection.execute(text(f"INSERT INTO {name}({name}) VALUES ('rebuild')"))
+
+
+def fts_available(db):
+    # Таблицы создаёт flask init-db; пока их нет, проверяем заново при каждом поиске
+    global _fts_enabled
+    if not _fts_enabled and db.engine.dialect.name == 'sqlite':
+        names = {row[0] for row in db.session.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%_search'"))}
+        _fts_enabled = set(SEARCH_TABLES) <= names
+    return _fts_enabled
+
+
+def clean_query(value):
+    # Управляющие символы (например, NUL из %00) FTS5 не принимает даже внутри фразы
+    return ''.join(ch for ch in value if ch.isprintable()).strip()
+
+
+def search_filter(db, model, query):
+    name = f'{model.__tablename__}_search'
+    source, columns = SEARCH_TABLES[name]
+    query = clean_query(query)
+    if fts_available(db) and len(query) >= MIN_FTS_QUERY_LENGTH:
+        phrase = '"' + query.replace('"', '""') + '"'
+        ids = text(f'SELECT rowid FROM {name} WHERE {name} MATCH :phrase').bindparams(phrase=phrase)
+        return model.id.in_(ids.columns(column('rowid', Integer)))
+    # Короткий запрос ищем по префиксу: сравнение диапазоном использует обычный B-tree индекс.
+    # Trigram-поиск не различает регистр, поэтому и здесь проверяем варианты «ив», «Ив», «ИВ»
+    # (lower() в SQLite меняет только латиницу и отключил бы индекс)
+    variants = {query, query.lower(), query.capitalize(), query.upper()}
+    return or_(*(and_(getattr(model, c) >= variant, getattr(model, c) < variant + '\U0010ffff')
+                 for c in columns for variant in sorted(variants)))
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    pass
+
+
+# Хэширование паролей в отдельных процессах: вычисление ключа не держит потоки веб-сервера
+class PasswordHasher:
+    def __init__(self):
+        self.method = 'scrypt'
+        self.workers = 2
+        self.max_pending = 8
+        self.timeout = 10
+        self.import_workers = 1
+        self._executor = None
+        self._import_executor = None
+        self._slots = None
+        self._prefix = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.workers * 4)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self.import_workers = app.config.get('PASSWORD_HASH_IMPORT_WORKERS', self.import_workers)
+        self._slots = threading.BoundedSemaphore(max(self.max_pending, 1))
+        self._prefix = None
+
+    def _submit(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        # Очередь ограничена: при наплыве входов отказываем сразу, а не копим ожидающие запросы
+        if not self._slots.acquire(timeout=0.5):
+            raise HashingBusy()
+        try:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            future = self._executor.submit(fn, *args)
+            try:
+                return future.result(self.timeout)
+            except FutureTimeout:
+                # Пул не успевает: для пользователя это та же перегрузка, что и полная очередь
+                future.cancel()
+                raise HashingBusy()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._submit(generate_password_hash, password, self.method)
+
+    def hash_many(self, passwords):
+        # Массовый импорт идёт в собственный пул из import_workers процессов: большой файл
+        # не занимает процессы, которые проверяют пароли при входе
+        if not self.workers or not self.import_workers:
+            return [generate_password_hash(password, self.method) for password in passwords]
+        with self._lock:
+            if self._import_executor is None:
+                self._import_executor = ProcessPoolExecutor(max_workers=self.import_workers)
+        chunksize = max(len(passwords) // (self.import_workers * 4), 1)
+        return list(self._import_executor.map(generate_password_hash, passwords,
+                                              [self.method] * len(passwords), chunksize=chunksize))
+
+    def verify(self, password_hash, password):
+        return self._submit(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        # Параметры метода (например scrypt:32768:8:1) записаны в начале хэша
+        if self._prefix is None:
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._prefix
+
+
+# Ограничение числа неудачных попыток входа для одного имени пользователя
+class LoginLimiter:
+    def __init__(self, max_attempts=5, window=300, max_names=10000):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.max_names = max_names
+        # Имена упорядочены по последней неудачной попытке: в начале те, что давно не пытались войти
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_attempts = app.config.get('LOGIN_MAX_ATTEMPTS', self.max_attempts)
+        self.window = app.config.get('LOGIN_ATTEMPT_WINDOW', self.window)
+        self.max_names = app.config.get('LOGIN_TRACKED_NAMES', self.max_names)
+
+    def _recent(self, username, now):
+        failures = self._failures.get(username)
+        if failures is None:
+            return None
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+        if not failures:
+            del self._failures[username]
+            return None
+        return failures
+
+    def is_blocked(self, username):
+        with self._lock:
+            failures = self._recent(username.lower(), time.monotonic())
+            return failures is not None and len(failures) >= self.max_attempts
+
+    def register_failure(self, username):
+        now = time.monotonic()
+        with self._lock:
+            failures = self._recent(username.lower(), now)
+            if failures is None:
+                failures = self._failures[username.lower()] = deque(maxlen=self.max_attempts)
+            failures.append(now)
+            self._failures.move_to_end(username.lower())
+            self._sweep(now)
+
+    def _sweep(self, now):
+        # Перебор несуществующих имён не должен раздувать память: устаревшие записи убираются,
+        # а сверх max_names вытесняются самые старые
+        while self._failures:
+            failures = next(iter(self._failures.values()))
+            if failures[-1] > now - self.window and len(self._failures) <= self.max_names:
+                break
+            self._failures.popitem(last=False)
+
+    def reset(self, username):
+        with self._lock:
+            self._failures.pop(username.lower(), None)
+
+
+password_hasher = PasswordHasher()
+login_limiter = LoginLimiter()
@@ -0,0 +1,67 @@
+// Обновления без перезагрузки: страница подписывается на /events и реагирует на темы из data-live
+(function () {
+    var content = document.querySelector('[data-live]');
+    if (!content || !window.EventSource) {
+        return;
+    }
+    var topics = content.getAttribute('data-live').split(' ');
+    var userId = Number(document.body.getAttribute('data-user-id'));
+    var notice = document.getElementById('live-notice');
+    var source = new EventSource(content.getAttribute('data-events-url'));
+
+    function wants(topic) {
+        return topics.indexOf(topic) !== -1;
+    }
+
+    function showNotice(text) {
+        notice.querySelector('span').textContent = text;
+        notice.hidden = false;
+    }
+
+    function ownOrders(data) {
+        return wants('all-orders') || (wants('orders') && data.user_id === userId);
+    }
+
+    source.addEventListener('order.paid', function (e) {
+        var data = JSON.parse(e.data);
+        if (!ownOrders(data)) {
+            return;
+        }
+        data.orders.forEach(function (order) {
+            var status = document.querySelector('[data-order-status="' + order.id + '"]');
+            if (status) {
+                status.textContent = 'Оплачено';
+            }
+            var pay = document.querySelector('[data-order-pay="' + order.id + '"]');
+            if (pay) {
+                pay.remove();
+            }
+        });
+        if (wants('all-orders')) {
+            showNotice('Оплачены новые заказы.');
+        }
+    });
+
+    source.addEventListener('order.created', function (e) {
+        if (ownOrders(JSON.parse(e.data))) {
+            showNotice('Появились новые заказы.');
+        }
+    });
+
+    source.addEventListener('catalog.changed', function () {
+        if (wants('catalog')) {
+            showNotice('Каталог изменился.');
+        }
+    });
+
+    source.addEventListener('user.changed', function () {
+        if (wants('users')) {
+            showNotice('Список пользователей изменился.');
+        }
+    });
+
+    // Сервер не смог доставить часть событий: надёжнее перечитать страницу
+    source.addEventListener('resync', function () {
+        showNotice('Данные могли измениться.');
+    });
+})();
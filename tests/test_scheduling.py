@@ -0,0 +1,46 @@
+import random
+from datetime import datetime, timedelta
+
+from scheduling import MechanicSchedule
+
+BASE = datetime(2030, 1, 1, 9)
+SLOT = timedelta(hours=1)
+
+
+def brute_next_free(busy, start, duration):
+    # Эталон: сдвигаемся на конец первого пересекающегося интервала, пока окно не станет свободным
+    while True:
+        overlap = [end for s, end in busy if s < start + duration and end > start]
+        if not overlap:
+            return start
+        start = max(overlap)
+
+
+def test_matches_brute_force():
+    rng = random.Random(1)
+    for _ in range(300):
+        schedule = MechanicSchedule()
+        busy = []
+        for _ in range(rng.randint(0, 30)):
+            if busy and rng.random() < 0.3:
+                start, end = busy.pop(rng.randrange(len(busy)))
+                schedule.remove(start, end)
+            else:
+                wanted = BASE + rng.randint(0, 40) * SLOT
+                start = schedule.next_free(wanted, SLOT)
+                assert start == brute_next_free(busy, wanted, SLOT)
+                schedule.add(start, start + SLOT)
+                busy.append((start, start + SLOT))
+            assert len(schedule) == len(busy)
+            for _ in range(5):
+                probe = BASE + rng.randint(-2, 45) * SLOT
+                assert schedule.next_free(probe, SLOT) == brute_next_free(busy, probe, SLOT)
+
+
+def test_loads_existing_bookings():
+    busy = [(BASE + i * SLOT, BASE + (i + 1) * SLOT) for i in (0, 1, 2, 5)]
+    schedule = MechanicSchedule(busy)
+    assert schedule.starts == [BASE, BASE + 5 * SLOT]
+    assert schedule.next_free(BASE, SLOT) == BASE + 3 * SLOT
+    schedule.remove(BASE + SLOT, BASE + 2 * SLOT)
+    assert schedule.next_free(BASE, SLOT) == BASE + SLOT
@@ -0,0 +1,236 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from sqlalchemy import insert, select
+
+from config import db, User, WorkType, Order, ArchivedOrder, Mechanic
+from security import password_hasher
+from analytics import record_registration
+from validation import validate_user, validate_mechanic
+
+# Колонки выгрузки; хэши паролей наружу не отдаются
+EXPORT_QUERIES = {
+    'orders': lambda: select(Order.id, Order.user_id, User.username, Order.work_type_id,
+                             WorkType.name.label('work_type'), Order.mechanic_id, Order.slot_start,
+                             Order.slot_end, Order.created_at, Order.is_paid)
+    .outerjoin(User, Order.user_id == User.id)
+    .outerjoin(WorkType, Order.work_type_id == WorkType.id)
+    .order_by(Order.id),
+    'users': lambda: select(User.id, User.username, User.role, User.date_of_birth, User.gender,
+                            User.phone, User.email, User.created_at)
+    .where(User.deleted_at.is_(None)).order_by(User.id),
+    'mechanics': lambda: select(Mechanic.id, Mechanic.name, Mechanic.phone,
+                                Mechanic.specialization).order_by(Mechanic.id),
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+IMPORT_COLUMNS = {
+    'users': ['username', 'password', 'date_of_birth', 'gender', 'phone', 'email'],
+    'mechanics': ['name', 'phone', 'specialization'],
+}
+
+# Сколько ошибок показывать администратору после импорта
+MAX_REPORTED_ERRORS = 100
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def _archived_order_partitions(chunk_size):
+    # Архив может лежать в другой базе, поэтому имена пользователей и видов работ
+    # подставляются для каждой части отдельными запросами, а не через JOIN
+    query = select(ArchivedOrder.id, ArchivedOrder.user_id, ArchivedOrder.work_type_id, ArchivedOrder.mechanic_id,
+                   ArchivedOrder.slot_start, ArchivedOrder.slot_end, ArchivedOrder.created_at,
+                   ArchivedOrder.is_paid).order_by(ArchivedOrder.id)
+    result = db.session.execute(query.execution_options(yield_per=chunk_size))
+    for rows in result.partitions():
+        usernames = dict(db.session.execute(
+            select(User.id, User.username).where(User.id.in_({row.user_id for row in rows}))).all())
+        work_types = dict(db.session.execute(
+            select(WorkType.id, WorkType.name).where(WorkType.id.in_({row.work_type_id for row in rows}))).all())
+        yield [(row.id, row.user_id, usernames.get(row.user_id), row.work_type_id,
+                work_types.get(row.work_type_id), row.mechanic_id, row.slot_start, row.slot_end,
+                row.created_at, row.is_paid) for row in rows]
+
+
+def _partitions(kind, chunk_size):
+    # Строки читаются курсором частями по chunk_size, в памяти только текущая часть
+    result = db.session.execute(EXPORT_QUERIES[kind]().execution_options(yield_per=chunk_size))
+    yield from result.partitions()
+    if kind == 'orders':
+        yield from _archived_order_partitions(chunk_size)
+
+
+def export_chunks(kind, fmt, chunk_size):
+    columns = list(EXPORT_QUERIES[kind]().selected_columns.keys())
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for rows in _partitions(kind, chunk_size):
+            writer.writerows([_csv_value(value) for value in row] for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    else:
+        for rows in _partitions(kind, chunk_size):
+            yield ''.join(json.dumps(dict(zip(columns, row)), ensure_ascii=False,
+                                     default=_json_default) + '\n' for row in rows)
+
+
+def read_rows(stream, fmt):
+    # (номер строки файла, словарь значений или None, если строку не удалось разобрать)
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_num, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_num, row if isinstance(row, dict) else None
+
+
+def _field(row, name):
+    value = row.get(name)
+    return '' if value is None else str(value).strip()
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line_num, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_num, message))
+
+
+def _batches(rows, size):
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert_users(batch, result, seen_usernames, seen_emails):
+    usernames = [row['username'] for _, row in batch]
+    emails = [row['email'] for _, row in batch if row['email']]
+    # Уникальность проверяется одним запросом на пакет, а не запросом на строку
+    taken_usernames = set(db.session.scalars(select(User.username).where(User.username.in_(usernames))))
+    taken_emails = set(db.session.scalars(select(User.email).where(User.email.in_(emails)))) if emails else set()
+
+    valid = []
+    for line_num, row in batch:
+        if row['username'] in taken_usernames or row['username'] in seen_usernames:
+            result.error(line_num, 'Пользователь с таким именем уже существует!')
+            continue
+        if row['email'] and (row['email'] in taken_emails or row['email'] in seen_emails):
+            result.error(line_num, 'Пользователь с таким email уже существует!')
+            continue
+        seen_usernames.add(row['username'])
+        if row['email']:
+            seen_emails.add(row['email'])
+        valid.append(row)
+    if not valid:
+        return
+
+    hashes = password_hasher.hash_many([row.pop('password') for row in valid])
+    now = datetime.utcnow()
+    for row, password_hash in zip(valid, hashes):
+        row.update(password_hash=password_hash, role='user', created_at=now,
+                   phone=row['phone'] or None, email=row['email'] or None)
+    db.session.execute(insert(User), valid)
+    record_registration(now.date(), len(valid))
+    db.session.commit()
+    result.created += len(valid)
+
+
+def import_users(rows, batch_size, progress=None):
+    result = ImportResult()
+    seen_usernames, seen_emails = set(), set()
+
+    def checked():
+        for line_num, row in rows:
+            if row is None:
+                result.error(line_num, 'Строку не удалось разобрать')
+                continue
+            values = {name: _field(row, name) for name in IMPORT_COLUMNS['users']}
+            error, dob = validate_user(values['username'], values['password'], values['date_of_birth'],
+                                       values['gender'], values['phone'], values['email'])
+            if error:
+                result.error(line_num, error)
+                continue
+            values['date_of_birth'] = dob
+            yield line_num, values
+
+    for batch in _batches(checked(), batch_size):
+        _insert_users(batch, result, seen_usernames, seen_emails)
+        if progress:
+            progress(result)
+    result.errors.sort()
+    return result
+
+
+def import_mechanics(rows, batch_size, progress=None):
+    result = ImportResult()
+
+    def checked():
+        for line_num, row in rows:
+            if row is None:
+                result.error(line_num, 'Строку не удалось разобрать')
+                continue
+            values = {name: _field(row, name) for name in IMPORT_COLUMNS['mechanics']}
+            error = validate_mechanic(values['name'], values['phone'])
+            if error:
+                result.error(line_num, error)
+                continue
+            values['phone'] = values['phone'] or None
+            yield values
+
+    for batch in _batches(checked(), batch_size):
+        db.session.execute(insert(Mechanic), batch)
+        db.session.commit()
+        result.created += len(batch)
+        if progress:
+            progress(result)
+    result.errors.sort()
+    return result
+
+
+IMPORTERS = {
+    'users': import_users,
+    'mechanics': import_mechanics,
+}
@@ -0,0 +1,37 @@
+import re
+from datetime import datetime, date
+
+PHONE_RE = re.compile(r'^\d{10}$')
+EMAIL_RE = re.compile(r'[^@]+@[^@]+\.[^@]+')
+GENDERS = ('male', 'female', 'other')
+
+
+# Общие правила для регистрации, формы исполнителя и массового импорта.
+# Проверки уникальности делает вызывающий код: форма — по одной записи, импорт — пачкой.
+def validate_user(username, password, date_of_birth, gender, phone, email):
+    # Возвращает (текст ошибки или None, дата рождения)
+    if len(username) < 3:
+        return 'Имя пользователя должно содержать минимум 3 символа!', None
+    if len(password) < 6:
+        return 'Пароль должен содержать минимум 6 символов!', None
+    try:
+        dob = datetime.strptime(date_of_birth, '%Y-%m-%d').date()
+    except ValueError:
+        return 'Неверный формат даты! Используйте YYYY-MM-DD.', None
+    if (date.today() - dob).days < 18 * 365:
+        return 'Вам должно быть не менее 18 лет!', None
+    if gender not in GENDERS:
+        return 'Неверное значение пола!', None
+    if phone and not PHONE_RE.match(phone):
+        return 'Номер телефона должен содержать ровно 10 цифр!', None
+    if email and not EMAIL_RE.match(email):
+        return 'Неверный формат email!', None
+    return None, dob
+
+
+def validate_mechanic(name, phone):
+    if not name:
+        return 'Имя исполнителя обязательно!'
+    if phone and not PHONE_RE.match(phone):
+        return 'Номер телефона должен содержать ровно 10 цифр!'
+    return None